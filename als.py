@@ -0,0 +1,257 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the ALSModel class, a matrix factorization model of the
+user and movie graph that can be used by the RecommendationSystem class
+instead of the similar user points.
+
+The model is trained with implicit-feedback alternating least squares: every
+edge between a user and a movie is an observed preference with confidence
+1 + alpha, every other pair is an unobserved preference with confidence 1, and
+the user and movie factors are solved for in turn with NumPy on the CPU.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import json
+import os
+from typing import Iterable, Optional
+import numpy as np
+import csr_graph, snapshot
+
+# The number of candidate movies returned for each query, which are then filtered by genre
+NUM_CANDIDATES = 100
+
+# The number of floats of linked factors or normal matrices formed at once while solving a side, which bounds the
+# memory used by each batch of rows
+SOLVE_CHUNK_VALUES = 2 ** 22
+
+
+class ALSModel:
+    """A trained implicit-feedback matrix factorization of the user and movie graph.
+
+    Instance Attributes:
+        - user_ids: The user id of each row of user_factors.
+        - movie_ids: The movie id of each row of movie_factors.
+        - user_factors: The latent factors of each user.
+        - movie_factors: The latent factors of each movie.
+        - regularization: The weight of the L2 penalty on the factors.
+        - alpha: The extra confidence given to each observed edge.
+
+    Representation Invariants:
+        - self.user_factors.shape[0] == len(self.user_ids)
+        - self.movie_factors.shape[0] == len(self.movie_ids)
+        - self.user_factors.shape[1] == self.movie_factors.shape[1]
+    """
+    user_ids: np.ndarray
+    movie_ids: np.ndarray
+    user_factors: np.ndarray
+    movie_factors: np.ndarray
+    regularization: float
+    alpha: float
+    _movie_index: dict[int, int]
+    # The regularized Gram matrix of movie_factors, shared by every query
+    _movie_gram: np.ndarray
+
+    def __init__(self, user_ids: np.ndarray, movie_ids: np.ndarray, user_factors: np.ndarray,
+                 movie_factors: np.ndarray, regularization: float, alpha: float) -> None:
+        """Initialize a model from its trained factors."""
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.user_factors = user_factors
+        self.movie_factors = movie_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self._movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids.tolist())}
+        self._movie_gram = _gram(movie_factors, regularization)
+
+    def query_factors(self, movie_ids: list[int]) -> np.ndarray:
+        """Return the latent factors of a new user who only reviewed the movies with the given ids, solved against
+        the trained movie factors without retraining. The movies that are not in the model are ignored.
+
+        The Gram matrix of the movie factors is computed once with the model, so each query only adds the contribution
+        of its own movies.
+        """
+        items = np.array([self._movie_index[movie_id] for movie_id in movie_ids if movie_id in self._movie_index],
+                         dtype=np.int64)
+
+        return _solve_row(self.movie_factors, self._movie_gram, items, self.alpha)
+
+    def recommend(self, movie_ids: list[int], num: int = NUM_CANDIDATES) -> list[int]:
+        """Return the ids of the num movies with the highest predicted preference for a user who liked the movies with
+        the given ids, from the highest to the lowest. The given movies themselves are excluded.
+
+        The scores of all movies are computed with a single matrix-vector product.
+        """
+        scores = self.movie_factors @ self.query_factors(movie_ids)
+        for movie_id in movie_ids:
+            if movie_id in self._movie_index:
+                scores[self._movie_index[movie_id]] = -np.inf
+
+        num = min(num, len(scores))
+        top = np.argpartition(-scores, num - 1)[:num] if num > 0 else np.array([], dtype=np.int64)
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [movie_id for movie_id in self.movie_ids[top].tolist() if movie_id not in movie_ids]
+
+    def recommend_many(self, queries: list[list[int]], num: int = NUM_CANDIDATES,
+                       chunk_size: int = 256) -> list[list[int]]:
+        """Return the result of recommend for each of the given lists of liked movie ids, in the same order.
+
+        The queries are scored chunk_size at a time with a single matrix product per chunk, so the memory used for the
+        scores stays bounded.
+        """
+        result = []
+
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            scores = np.stack([self.query_factors(movie_ids) for movie_ids in chunk]) @ self.movie_factors.T
+
+            for row, movie_ids in enumerate(chunk):
+                for movie_id in movie_ids:
+                    if movie_id in self._movie_index:
+                        scores[row, self._movie_index[movie_id]] = -np.inf
+
+            k = min(num, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k > 0 else np.zeros((len(chunk), 0), dtype=int)
+
+            for row, movie_ids in enumerate(chunk):
+                ranked = top[row][np.argsort(-scores[row, top[row]], kind='stable')]
+                result.append([movie_id for movie_id in self.movie_ids[ranked].tolist() if movie_id not in movie_ids])
+
+        return result
+
+    def save(self, model_file: str, sources: Optional[dict] = None) -> None:
+        """Save the trained factors of this model into a file at the given path, together with the keys of the source
+        files it was trained from (see snapshot.source_key).
+        """
+        with open(model_file, 'wb') as file:
+            np.savez(file, user_ids=self.user_ids, movie_ids=self.movie_ids, user_factors=self.user_factors,
+                     movie_factors=self.movie_factors, regularization=np.array(self.regularization),
+                     alpha=np.array(self.alpha), sources=np.array(json.dumps(sources or {})))
+
+
+def train(user_movies: dict[int, Iterable[int]], factors: int = 32, iterations: int = 10,
+          regularization: float = 0.1, alpha: float = 40.0, seed: int = 0) -> ALSModel:
+    """Return a model trained on a dictionary that maps each user id to their reviewed movie ids.
+
+    Each iteration solves for every user's factors with the movie factors fixed, then for every movie's factors with
+    the user factors fixed. The Gram matrix of the fixed side is computed once per half-step, so each row only adds
+    the contribution of its own edges.
+
+    Preconditions:
+        - factors >= 1
+        - iterations >= 1
+    """
+    user_ids, movie_ids, user_offsets, user_movie_indexes, movie_offsets, movie_users = \
+        csr_graph.adjacency_arrays(user_movies)
+    generator = np.random.default_rng(seed)
+    user_factors = generator.normal(0, 0.01, size=(len(user_ids), factors))
+    movie_factors = generator.normal(0, 0.01, size=(len(movie_ids), factors))
+
+    for _ in range(iterations):
+        user_factors = _solve_side(movie_factors, user_offsets, user_movie_indexes, regularization, alpha)
+        movie_factors = _solve_side(user_factors, movie_offsets, movie_users, regularization, alpha)
+
+    return ALSModel(user_ids, movie_ids, user_factors, movie_factors, regularization, alpha)
+
+
+def load(model_file: str, sources: Optional[dict[str, str]] = None) -> Optional[ALSModel]:
+    """Return the model saved in the file at the given path.
+
+    If sources is given, it maps names to the paths of the source files the model should have been trained from, and
+    None is returned if any of them has changed since the model was saved. None is also returned if there is no such
+    file.
+    """
+    if not os.path.exists(model_file):
+        return None
+
+    with np.load(model_file) as arrays:
+        saved_sources = json.loads(str(arrays['sources']))
+        if sources is not None and any(name not in saved_sources or not snapshot.is_fresh(saved_sources[name], path)
+                                       for name, path in sources.items()):
+            return None
+
+        return ALSModel(arrays['user_ids'], arrays['movie_ids'], arrays['user_factors'], arrays['movie_factors'],
+                        float(arrays['regularization']), float(arrays['alpha']))
+
+
+def _gram(fixed: np.ndarray, regularization: float) -> np.ndarray:
+    """Return the regularized Gram matrix of the given factors."""
+    return fixed.T @ fixed + regularization * np.eye(fixed.shape[1])
+
+
+def _solve_side(fixed: np.ndarray, offsets: np.ndarray, indexes: np.ndarray, regularization: float,
+                alpha: float) -> np.ndarray:
+    """Return the least squares factors of every row of a CSR adjacency with the given offsets and indexes, given the
+    fixed factors of the other side of the graph.
+
+    The rows are grouped by their number of linked items, rounded up to a power of two, and each group is solved in
+    batches: the linked factors of every row of a batch are gathered into one array padded with zero factors, their
+    normal equations (see _solve_row) are formed with a single batched matrix product, and solved with a single
+    batched np.linalg.solve, so no Python code runs per row. The linked factors and the normal matrices of each batch
+    take at most about SOLVE_CHUNK_VALUES floats each, unless a single row needs more.
+    """
+    gram = _gram(fixed, regularization)
+    factors = fixed.shape[1]
+    result = np.zeros((len(offsets) - 1, factors))
+    lengths = np.diff(offsets)
+    # the extra last row of zero factors pads the rows that have fewer linked items than the longest row of a batch
+    padded = np.vstack([fixed, np.zeros((1, factors))])
+    groups = np.zeros(len(lengths), dtype=np.int64)
+    groups[lengths > 0] = np.ceil(np.log2(lengths[lengths > 0])).astype(np.int64)
+
+    for group in np.unique(groups[lengths > 0]).tolist():
+        rows = np.flatnonzero((groups == group) & (lengths > 0))
+        width = int(lengths[rows].max())
+        # each row of a batch gathers width linked factors and forms a normal matrix of factors by factors
+        batch_size = max(1, SOLVE_CHUNK_VALUES // (max(width, factors) * factors))
+
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            positions = offsets[batch][:, None] + np.arange(width)[None, :]
+            items = np.where(positions < offsets[batch + 1][:, None],
+                             indexes[np.minimum(positions, len(indexes) - 1)], len(fixed))
+            linked = padded[items]
+            normal = gram + alpha * np.matmul(linked.transpose(0, 2, 1), linked)
+            result[batch] = np.linalg.solve(normal, (1 + alpha) * linked.sum(axis=1)[:, :, None])[:, :, 0]
+
+    return result
+
+
+def _solve_row(fixed: np.ndarray, gram: np.ndarray, items: np.ndarray, alpha: float) -> np.ndarray:
+    """Return the least squares factors of a single row linked to the given items of the other side.
+
+    With a preference of 1 and a confidence of 1 + alpha for every linked item, the normal equations are
+    (gram + alpha * Y^T Y) x = (1 + alpha) * Y^T 1, where Y holds the fixed factors of the linked items.
+    """
+    if len(items) == 0:
+        return np.zeros(fixed.shape[1])
+
+    linked = fixed[items]
+
+    return np.linalg.solve(gram + alpha * (linked.T @ linked), (1 + alpha) * linked.sum(axis=0))
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'numpy', 'csr_graph', 'snapshot'],
+        'allowed-io': ['save'],
+        'max-line-length': 120
+    })
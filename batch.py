@@ -0,0 +1,210 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This Python module runs the movie recommendation system on a file of queries
+from the command line, without the graphical user interface. For example:
+
+    python batch.py --input queries.jsonl --output results.jsonl --workers 4
+
+Each line of the input is a JSON object such as
+{"liked": ["Toy Story", "Heat", "Casino"], "genre": "Drama"}, where the genre
+is optional. Each line of the output is the query on the same line of the
+input, with every key (such as an "id") kept, and either a "movies" key with
+the top three movies of the genre (or every recommended title from the highest
+to the lowest rating if no genre is given) or an "error" key.
+
+The system is loaded once, and the queries are read, answered by a pool of
+worker processes and written in batches, with only a few batches in memory at
+once, so files of any size can be processed. The throughput of each batch is
+reported on the standard error.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Iterable, Iterator, Optional, TextIO
+import recommendation_system as rs
+
+# The recommendation system shared by the worker processes and the arguments it was loaded from
+_BATCH: dict[str, Any] = {}
+
+
+def process(lines: Iterable[str], output: TextIO, movie_file: str, rating_file: str,
+            snapshot_file: Optional[str] = None, batch_size: int = 256, workers: Optional[int] = None,
+            report: Optional[TextIO] = None) -> int:
+    """Answer the queries in the given JSON lines and write their results to output as JSON lines in the same order,
+    and return the number of queries answered.
+
+    The queries are answered batch_size at a time by the given number of worker processes (all processors by default),
+    or in this process if workers is 1. At most two batches per worker are read ahead of the ones being written. If
+    report is given, the number of queries, time and throughput of each batch are written to it.
+    """
+    arguments = (movie_file, rating_file, snapshot_file)
+    _prepare_batch(*arguments)
+    batches = _batches(lines, batch_size)
+    workers = workers or os.cpu_count() or 1
+    total = 0
+
+    if workers == 1:
+        for number, batch in enumerate(batches, 1):
+            total += _write_batch(output, report, number, _answer_batch(batch))
+        return total
+
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=_prepare_batch,
+                                                initargs=arguments) as executor:
+        pending = deque(executor.submit(_answer_batch, batch) for batch in islice(batches, 2 * workers))
+        number = 0
+
+        while pending:
+            results = pending.popleft().result()
+            for batch in islice(batches, 1):
+                pending.append(executor.submit(_answer_batch, batch))
+
+            number += 1
+            total += _write_batch(output, report, number, results)
+
+    return total
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    """Answer the queries of the file in the given command line arguments."""
+    parser = argparse.ArgumentParser(description='Recommend movies for a JSON lines file of queries.')
+    parser.add_argument('--input', default='-', help='the file of queries, or - for the standard input')
+    parser.add_argument('--output', default='-', help='the file of results, or - for the standard output')
+    parser.add_argument('--movie-file', default='data/movies_metadata.csv')
+    parser.add_argument('--rating-file', default='data/ratings_small.csv')
+    parser.add_argument('--snapshot', default='data/graph.snapshot')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--workers', type=int)
+    options = parser.parse_args(arguments)
+
+    source = sys.stdin if options.input == '-' else open(options.input, encoding='utf-8')
+    target = sys.stdout if options.output == '-' else open(options.output, 'w', encoding='utf-8')
+
+    try:
+        start = time.perf_counter()
+        total = process(source, target, options.movie_file, options.rating_file, options.snapshot,
+                        options.batch_size, options.workers, sys.stderr)
+        seconds = time.perf_counter() - start
+        print(f'{total} queries in {seconds:.2f} s ({total / max(seconds, 1e-9):.1f} queries/s)', file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+def _batches(lines: Iterable[str], batch_size: int) -> Iterator[list[str]]:
+    """Yield the non-empty lines in lists of batch_size lines, reading them only as the lists are needed.
+
+    >>> list(_batches(['a', '', 'b', 'c'], 2))
+    [['a', 'b'], ['c']]
+    """
+    lines = (line for line in lines if line.strip() != '')
+
+    while True:
+        batch = list(islice(lines, batch_size))
+        if batch == []:
+            return
+        yield batch
+
+
+def _prepare_batch(movie_file: str, rating_file: str, snapshot_file: Optional[str]) -> None:
+    """Load the recommendation system from the given files, unless it was already loaded from them, for example in
+    the process this worker was forked from.
+    """
+    arguments = (movie_file, rating_file, snapshot_file)
+    if _BATCH.get('arguments') == arguments:
+        return
+
+    system = rs.RecommendationSystem()
+    system.add_movies_users(movie_file, rating_file, snapshot_file)
+    _BATCH.update({'arguments': arguments, 'system': system})
+
+
+def _answer_batch(lines: list[str]) -> tuple[list[dict[str, Any]], float]:
+    """Return the results of the queries in the given JSON lines, in the same order, and the time they took in seconds.
+
+    The valid queries are answered together with RecommendationSystem.recommend_batch, the ones with a genre with
+    the genre given up front, and the results only contain titles, genres and ratings, so they are cheap to send back
+    from a worker process.
+    """
+    start = time.perf_counter()
+    system = _BATCH['system']
+    movie_file, rating_file = _BATCH['arguments'][:2]
+    results = [_parse_query(line, system) for line in lines]
+    without_genre = [result for result in results if 'error' not in result and result.get('genre') is None]
+    with_genre = [result for result in results if 'error' not in result and result.get('genre') is not None]
+
+    recommended = system.recommend_batch([result['liked'] for result in without_genre], movie_file, rating_file)
+    for result, movies in zip(without_genre, recommended):
+        result['movies'] = [movie.title for movie in sorted(movies, key=lambda movie: (-movie.avg_rating,
+                                                                                      movie.movie_id))]
+
+    recommended = system.recommend_batch([result['liked'] for result in with_genre], movie_file, rating_file,
+                                         [result['genre'] for result in with_genre])
+    for result, movies in zip(with_genre, recommended):
+        result['movies'] = [{'title': title, 'genres': genres, 'rating': rating} for title, genres, rating in movies]
+
+    return (results, time.perf_counter() - start)
+
+
+def _parse_query(line: str, system: rs.RecommendationSystem) -> dict[str, Any]:
+    """Return the query in the given JSON line, or a result with an error if it is not a valid query."""
+    try:
+        query = json.loads(line)
+    except ValueError:
+        return {'error': 'not a JSON object'}
+
+    if not isinstance(query, dict):
+        return {'error': 'not a JSON object'}
+
+    liked_movies = query.get('liked')
+    if not isinstance(liked_movies, list) or len(liked_movies) != 3 or \
+            not all(isinstance(title, str) for title in liked_movies):
+        return {**query, 'error': 'liked must be a list of three movie titles'}
+
+    unknown = [title for title in liked_movies if not system.has_movie(title)]
+    if unknown != []:
+        return {**query, 'error': f'unknown movie {", ".join(unknown)}'}
+    elif query.get('genre') is not None and query['genre'] not in system.genres():
+        return {**query, 'error': f'unknown genre {query["genre"]}'}
+    else:
+        return query
+
+
+def _write_batch(output: TextIO, report: Optional[TextIO], number: int,
+                 batch: tuple[list[dict[str, Any]], float]) -> int:
+    """Write the results of the given batch to output, report its throughput, and return the number of results."""
+    results, seconds = batch
+    output.write(''.join(json.dumps(result) + '\n' for result in results))
+    output.flush()
+
+    if report is not None:
+        print(f'batch {number}: {len(results)} queries in {seconds:.3f} s '
+              f'({len(results) / max(seconds, 1e-9):.1f} queries/s)', file=report)
+
+    return len(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the benchmark suite of the recommendation system. It
+generates synthetic movie and rating files in the layout of "The Movies
+Dataset" at several scales, times each stage of the system on them, and saves
+the timings into a JSON file that can be compared with a saved baseline.
+
+Run it from the command line, for example:
+
+    python benchmark.py --scales 100k 1M --baseline benchmark_baseline.json
+
+The process exits with status 1 if a stage is slower than in the baseline by
+more than the given tolerance, so regressions are caught before deploying.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Callable, Optional
+import numpy as np
+import dataset, file_reading, recommendation_system as rs
+
+# The number of ratings of each scale, from the size of data/ratings_small.csv to the size of the full ratings file
+SCALES = {'100k': 100_000, '1M': 1_000_000, '26M': 26_000_000}
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
+
+# The number of ratings generated at a time, which bounds the memory used by the generator
+CHUNK_SIZE = 1_000_000
+
+# The exponent of the Zipf-like popularity of the movies: the movie of rank r is rated with a weight of
+# 1 / r ** exponent
+POPULARITY_EXPONENT = 0.7
+
+
+def generate(data_dir: str, num_ratings: int, seed: int = 0) -> tuple[str, str]:
+    """Generate a synthetic movie file and rating file with about num_ratings ratings in the given directory, unless
+    they were already generated, and return their paths.
+
+    The files have the columns of the real files that are read by file_reading. There is about one movie and one user
+    for every 100 ratings (and at most 45,000 movies, like the real dataset), and the movies are rated with a Zipf-like
+    popularity, so a few movies have most of the ratings. The same seed always generates the same files.
+    """
+    num_movies = min(45_000, max(1_000, num_ratings // 100))
+    num_users = max(100, num_ratings // 100)
+    movie_file = os.path.join(data_dir, f'movies_{num_ratings}_{seed}.csv')
+    rating_file = os.path.join(data_dir, f'ratings_{num_ratings}_{seed}.csv')
+
+    if os.path.exists(movie_file) and os.path.exists(rating_file):
+        return (movie_file, rating_file)
+
+    os.makedirs(data_dir, exist_ok=True)
+    generator = random.Random(seed)
+
+    with open(movie_file + '.tmp', 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['adult', 'genres', 'id', 'popularity', 'title', 'vote_average', 'vote_count'])
+        for movie_id in range(1, num_movies + 1):
+            genre_ids = generator.sample(range(len(GENRES)), generator.randint(1, 3))
+            genres = [{'id': i, 'name': GENRES[i]} for i in genre_ids]
+            writer.writerow(['False', str(genres), movie_id, round(generator.uniform(0, 30), 6),
+                             f'Synthetic Movie {movie_id}', round(generator.uniform(3.0, 9.5), 1),
+                             generator.randint(0, 5_000)])
+
+    weights = 1 / np.arange(1, num_movies + 1) ** POPULARITY_EXPONENT
+    cumulative = np.cumsum(weights / weights.sum())
+    order = np.random.default_rng(seed).permutation(num_movies) + 1
+    values = np.array([0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0])
+
+    with open(rating_file + '.tmp', 'w', encoding='utf-8') as file:
+        file.write('userId,movieId,rating,timestamp\n')
+        users_per_chunk = max(1, num_users * CHUNK_SIZE // num_ratings)
+
+        for first_user in range(1, num_users + 1, users_per_chunk):
+            rng = np.random.default_rng([seed, first_user])
+            last_user = min(num_users + 1, first_user + users_per_chunk)
+            size = num_ratings * (last_user - first_user) // num_users
+            user_ids = rng.integers(first_user, last_user, size)
+            movie_ids = order[np.minimum(np.searchsorted(cumulative, rng.random(size)), num_movies - 1)]
+
+            # each user rates each movie at most once, sorted by user like the real file
+            pairs = np.unique(user_ids.astype(np.int64) * (num_movies + 1) + movie_ids)
+            rows = np.column_stack([pairs // (num_movies + 1), pairs % (num_movies + 1),
+                                    values[rng.integers(0, len(values), len(pairs))],
+                                    rng.integers(800_000_000, 1_500_000_000, len(pairs))])
+            np.savetxt(file, rows, fmt=['%d', '%d', '%.1f', '%d'], delimiter=',')
+
+    os.replace(movie_file + '.tmp', movie_file)
+    os.replace(rating_file + '.tmp', rating_file)
+
+    return (movie_file, rating_file)
+
+
+def run(movie_file: str, rating_file: str, num_queries: int = 20, num_reviews: int = 100, backend: str = 'vertices',
+        seed: int = 0) -> dict[str, dict[str, float]]:
+    """Return the timings of each stage of the recommendation system on the given files.
+
+    Each stage maps to the number of operations it timed, their total time in seconds and the mean time of one
+    operation in milliseconds. The queries and reviews are chosen with the given seed, so every run times the same work.
+    """
+    stages = {}
+    generator = random.Random(seed)
+
+    _time(stages, 'parse_movies', lambda: file_reading.movie_file_reading(movie_file))
+    _time(stages, 'parse_ratings', lambda: file_reading.rating_file_reading(rating_file))
+
+    dataset.invalidate(movie_file, rating_file)
+    system = rs.RecommendationSystem(backend)
+    _time(stages, 'add_movies_users', lambda: system.add_movies_users(movie_file, rating_file))
+    _time(stages, 'popular_movies', system.popular_movies)
+
+    titles = sorted(system.dataset(movie_file, rating_file).title_id())
+    genres = sorted(system.dataset(movie_file, rating_file).genres())
+    queries = [generator.sample(titles, 3) for _ in range(num_queries)]
+    results = []
+
+    _time(stages, 'return_similar_users', lambda: [system.return_similar_users(liked_movies, movie_file, rating_file)
+                                                   for liked_movies in queries], num_queries)
+    _time(stages, 'return_movies', lambda: results.extend(system.return_movies(liked_movies, movie_file, rating_file)
+                                                          for liked_movies in queries), num_queries)
+    _time(stages, 'apply_filters', lambda: [system.apply_filters(movies, generator.choice(genres))
+                                            for movies in results], num_queries)
+
+    reviews = [(generator.choice(titles), round(generator.uniform(0.0, 10.0), 1)) for _ in range(num_reviews)]
+    _time(stages, 'add_reviews', lambda: [system.add_reviews(title, rating, movie_file, rating_file)
+                                          for title, rating in reviews], num_reviews)
+
+    return stages
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], tolerance: float = 0.25) -> list[dict[str, Any]]:
+    """Return the stages of the results that are slower than in the baseline by more than the given fraction, with
+    the mean time of one operation in milliseconds in both.
+
+    Only the stages of the scales that are in both results are compared.
+
+    >>> old = {'scales': {'100k': {'stages': {'return_movies': {'per_op_ms': 10.0}}}}}
+    >>> new = {'scales': {'100k': {'stages': {'return_movies': {'per_op_ms': 13.0}}}}}
+    >>> compare(new, old)
+    [{'scale': '100k', 'stage': 'return_movies', 'baseline_ms': 10.0, 'current_ms': 13.0}]
+    >>> compare(new, old, 0.5)
+    []
+    """
+    regressions = []
+
+    for scale, run_results in results['scales'].items():
+        baseline_stages = baseline.get('scales', {}).get(scale, {}).get('stages', {})
+
+        for stage, timing in run_results['stages'].items():
+            if stage in baseline_stages and \
+                    timing['per_op_ms'] > baseline_stages[stage]['per_op_ms'] * (1 + tolerance):
+                regressions.append({'scale': scale, 'stage': stage, 'baseline_ms': baseline_stages[stage]['per_op_ms'],
+                                    'current_ms': timing['per_op_ms']})
+
+    return regressions
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """Run the benchmark suite with the given command line arguments and return the exit status of the process."""
+    parser = argparse.ArgumentParser(description='Time each stage of the recommendation system on synthetic data.')
+    parser.add_argument('--scales', nargs='+', default=['100k', '1M'], choices=list(SCALES))
+    parser.add_argument('--data-dir', default=os.path.join('data', 'benchmark'))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='a results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--backend', default='vertices', choices=['vertices', 'csr'])
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--reviews', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(arguments)
+
+    results = {'python': platform.python_version(), 'machine': platform.machine(), 'backend': options.backend,
+               'scales': {}}
+
+    for scale in options.scales:
+        movie_file, rating_file = generate(options.data_dir, SCALES[scale], options.seed)
+        stages = run(movie_file, rating_file, options.queries, options.reviews, options.backend, options.seed)
+        results['scales'][scale] = {'num_ratings': SCALES[scale], 'stages': stages}
+
+        for stage, timing in stages.items():
+            print(f'{scale:>5} {stage:<22} {timing["per_op_ms"]:12.3f} ms x {timing["ops"]}')
+
+        dataset.invalidate(movie_file, rating_file)
+
+    with open(options.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    if options.baseline is None:
+        return 0
+
+    with open(options.baseline, encoding='utf-8') as file:
+        regressions = compare(results, json.load(file), options.tolerance)
+
+    for regression in regressions:
+        print(f'REGRESSION {regression["scale"]} {regression["stage"]}: {regression["baseline_ms"]:.3f} ms -> '
+              f'{regression["current_ms"]:.3f} ms')
+
+    return 1 if regressions != [] else 0
+
+
+def _time(stages: dict[str, dict[str, float]], stage: str, function: Callable[[], Any], ops: int = 1) -> None:
+    """Call the given function once and record its time in stages as the time of ops operations of the given stage."""
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+
+    stages[stage] = {'ops': ops, 'seconds': seconds, 'per_op_ms': seconds * 1000 / max(1, ops)}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the FallbackSampler class, which chooses random movies to
+top up the recommendations of a query whose similar users have not reviewed
+enough movies, such as a query for movies that few users have reviewed.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import random
+from typing import Iterable, Optional
+import numpy as np
+
+
+class FallbackSampler:
+    """A precomputed array of candidate movie ids to sample from without replacement, either uniformly or in
+    proportion to a weight of each movie, such as its number of ratings.
+
+    Uniform samples are drawn with a sparse Fisher-Yates shuffle, which only records the positions it swaps, so a
+    sample of k movies takes O(k) steps however many candidates there are. Weighted samples are drawn from an alias
+    table in O(1) per draw, and a movie drawn twice is drawn again, which stays O(k) as long as k is small compared
+    with the number of candidates.
+
+    The samples only depend on the given random number generator, so a generator seeded with the same value always
+    gives the same sample.
+
+    >>> sampler = FallbackSampler([-1, -2, -3, -4, -5])
+    >>> sample = sampler.sample(3, random.Random(0), exclude={-1})
+    >>> len(sample), -1 in sample, len(set(sample))
+    (3, False, 3)
+    >>> sample == sampler.sample(3, random.Random(0), exclude={-1})
+    True
+    >>> sorted(sampler.sample(10, random.Random(0)))
+    [-5, -4, -3, -2, -1]
+
+    Instance Attributes:
+        - movie_ids: The candidate movie ids.
+
+    Representation Invariants:
+        - self._prob is None or len(self._prob) == len(self.movie_ids) == len(self._alias)
+    """
+    movie_ids: np.ndarray
+    # The alias table of the weights: draw position i uniformly, and keep it with probability self._prob[i], or take
+    # self._alias[i] instead
+    _prob: Optional[np.ndarray]
+    _alias: Optional[np.ndarray]
+
+    def __init__(self, movie_ids: Iterable[int], weights: Optional[Iterable[float]] = None) -> None:
+        """Initialize a sampler of the given movie ids, weighted by the given weights, one for each movie, or uniform
+        if no weights are given.
+
+        Preconditions:
+            - weights is None or all(weight >= 0 for weight in weights)
+        """
+        self.movie_ids = np.fromiter(movie_ids, dtype=np.int64)
+        self._prob = None
+        self._alias = None
+
+        if weights is not None:
+            weights = np.fromiter(weights, dtype=np.float64, count=len(self.movie_ids))
+            if weights.sum() > 0:
+                self._prob, self._alias = _alias_table(weights)
+
+    def sample(self, k: int, generator: random.Random, exclude: Optional[set[int]] = None) -> list[int]:
+        """Return k different movie ids that are not in exclude, chosen with the given random number generator, or
+        every candidate that is not in exclude if there are fewer than k of them.
+        """
+        exclude = set() if exclude is None else exclude
+        result = []
+
+        if self._prob is not None:
+            chosen = set()
+            # give up on the weights once too many draws were repeated or excluded, and finish uniformly
+            for _ in range(4 * k + 16):
+                if len(result) == k:
+                    return result
+
+                position = int(generator.random() * len(self.movie_ids))
+                if generator.random() >= self._prob[position]:
+                    position = int(self._alias[position])
+
+                movie_id = int(self.movie_ids[position])
+                if movie_id not in chosen and movie_id not in exclude:
+                    chosen.add(movie_id)
+                    result.append(movie_id)
+
+            exclude = exclude | chosen
+
+        return result + self._sample_uniform(k - len(result), generator, exclude)
+
+    def _sample_uniform(self, k: int, generator: random.Random, exclude: set[int]) -> list[int]:
+        """Return k different movie ids that are not in exclude, chosen uniformly with the given random number
+        generator, or every candidate that is not in exclude if there are fewer than k of them.
+        """
+        # maps each position that was swapped to the position of the candidate now at it
+        swapped = {}
+        result = []
+
+        for i in range(len(self.movie_ids)):
+            if len(result) >= k:
+                break
+
+            j = generator.randrange(i, len(self.movie_ids))
+            swapped[i], swapped[j] = swapped.get(j, j), swapped.get(i, i)
+            movie_id = int(self.movie_ids[swapped[i]])
+
+            if movie_id not in exclude:
+                result.append(movie_id)
+
+        return result
+
+    def __len__(self) -> int:
+        """Return the number of candidate movies."""
+        return len(self.movie_ids)
+
+
+def _alias_table(weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the probability and alias arrays of an alias table of the given weights, built with Vose's method.
+
+    >>> prob, alias = _alias_table(np.array([1.0, 3.0]))
+    >>> prob.tolist(), alias.tolist()
+    ([0.5, 1.0], [1, 1])
+    """
+    n = len(weights)
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+
+    while small != [] and large != []:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+
+    return (prob, alias)
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'random'],
+        'max-line-length': 120
+    })
@@ -17,7 +17,7 @@ expressly prohibited.
 This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 """
 import random
-import file_reading
+import dataset
 
 
 def popular_movies(movie_file: str, rating_file: str) -> list[str]:
@@ -25,32 +25,25 @@ def popular_movies(movie_file: str, rating_file: str) -> list[str]:
 
     The popularity of a movie is defined as its average rating, and only the movies with 30 or more user ratings will be
     considered.
-    """
-    more_than_30_votes = []
-    file = file_reading.combined_files(movie_file, rating_file)
-    for movie in file:
-        if movie[4] >= 30:
-            more_than_30_votes.append([movie[1], movie[3]])
-
-    more_than_30_votes.sort(reverse=True, key=lambda x: x[1])
 
-    return [curr_movie[0] for curr_movie in more_than_30_votes[:50]]
+    The list only reflects the files. A recommendation system keeps its own list up to date with the reviews added to
+    it (see RecommendationSystem.popular_movies).
+    """
+    return list(dataset.load(movie_file, rating_file).popular_movies())
 
 
 def random_select_movies(num: int, movie_file: str, rating_file: str) -> set:
     """Randomly return a set of a specific number of movies from the given movie file.
 
-    The movies have ratings 5.0 or above and user reviews 3.0 or above.
-    """
-    return_set = set()
-    movies = file_reading.movie_title_id(movie_file, rating_file)
+    The movies have ratings 5.0 or above and user reviews 3.0 or above. Every movie is returned if the file has fewer
+    than num of them.
 
-    for _ in range(0, num):
-        selected_movie = random.choice(list(movies.keys()))
-        movies.pop(selected_movie)
-        return_set.add(selected_movie)
+    The titles are sampled without replacement in a single pass. A recommendation system tops up its recommendations
+    with a precomputed sampler instead (see cold_start.py).
+    """
+    titles = list(dataset.load(movie_file, rating_file).title_id())
 
-    return return_set
+    return set(random.sample(titles, min(max(num, 0), len(titles))))
 
 
 if __name__ == '__main__':
@@ -61,7 +54,7 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['file_reading', 'random'],
+        'extra-imports': ['dataset', 'random'],
         'disable': ['redefined-builtin'],
         'max-line-length': 120
     })
@@ -0,0 +1,264 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the CooccurrenceIndex class, which precomputes for
+each movie the other movies that are most often reviewed by the same users, so
+that a recommendation only needs to merge the precomputed lists of the liked
+movies instead of visiting every similar user's history.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import json
+import os
+from typing import Iterable, Optional
+import numpy as np
+import csr_graph, snapshot
+
+# The number of (movie, other movie) pairs listed at once while building an index, which bounds its memory use
+PAIRS_PER_BLOCK = 2 ** 20
+
+
+class CooccurrenceIndex:
+    """An index of the top co-occurring movies of each movie.
+
+    Two movies co-occur once for every user who reviewed both of them. The neighbours of the movie with index i are
+    neighbour_movies[offsets[i]:offsets[i + 1]], sorted by decreasing count, and their counts are found at the same
+    positions in neighbour_counts.
+
+    Reviews added after the index is built are kept as count increments in a small overlay, which is merged into the
+    precomputed lists when they are queried.
+
+    Instance Attributes:
+        - top_n: The maximum number of neighbours kept for each movie.
+        - movie_ids: The movie id of each movie index.
+        - offsets: The start and end of the neighbours of each movie index.
+        - neighbour_movies: The ids of the neighbouring movies.
+        - neighbour_counts: The number of users who reviewed both movies.
+
+    Representation Invariants:
+        - self.top_n >= 1
+        - len(self.offsets) == len(self.movie_ids) + 1
+        - len(self.neighbour_movies) == len(self.neighbour_counts) == self.offsets[-1]
+    """
+    top_n: int
+    movie_ids: np.ndarray
+    offsets: np.ndarray
+    neighbour_movies: np.ndarray
+    neighbour_counts: np.ndarray
+    _movie_index: dict[int, int]
+    _extra_counts: dict[int, dict[int, int]]
+
+    def __init__(self, top_n: int, movie_ids: np.ndarray, offsets: np.ndarray, neighbour_movies: np.ndarray,
+                 neighbour_counts: np.ndarray) -> None:
+        """Initialize an index from its arrays."""
+        self.top_n = top_n
+        self.movie_ids = movie_ids
+        self.offsets = offsets
+        self.neighbour_movies = neighbour_movies
+        self.neighbour_counts = neighbour_counts
+        self._movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids.tolist())}
+        self._extra_counts = {}
+
+    def neighbours(self, movie_id: int) -> dict[int, int]:
+        """Return a dictionary that maps the ids of the top co-occurring movies of the movie with the given id to their
+        co-occurrence counts.
+
+        Return an empty dictionary if the movie is not in the index.
+        """
+        result = {}
+
+        if movie_id in self._movie_index:
+            i = self._movie_index[movie_id]
+            start, end = self.offsets[i], self.offsets[i + 1]
+            result = dict(zip(self.neighbour_movies[start:end].tolist(), self.neighbour_counts[start:end].tolist()))
+
+        for other_id, count in self._extra_counts.get(movie_id, {}).items():
+            result[other_id] = result.get(other_id, 0) + count
+
+        return result
+
+    def merged_neighbours(self, movie_ids: list[int]) -> list[int]:
+        """Return the ids of the movies that co-occur with any of the given movies, sorted by decreasing total
+        co-occurrence count. The given movies themselves are excluded.
+        """
+        totals = {}
+        for movie_id in movie_ids:
+            for other_id, count in self.neighbours(movie_id).items():
+                totals[other_id] = totals.get(other_id, 0) + count
+
+        for movie_id in movie_ids:
+            totals.pop(movie_id, None)
+
+        return sorted(totals, key=lambda other_id: (-totals[other_id], other_id))
+
+    def add_review(self, reviewed_movies: Iterable[int], movie_id: int) -> None:
+        """Update the index after a user who already reviewed the given movies also reviews the movie with the given
+        id.
+
+        The counts are only added on top of the precomputed lists, so a movie that was cut from the top_n neighbours
+        of another movie when the index was built can only come back once the index is rebuilt.
+        """
+        for other_id in reviewed_movies:
+            if other_id != movie_id:
+                self._add_count(movie_id, other_id)
+                self._add_count(other_id, movie_id)
+
+    def _add_count(self, movie_id: int, other_id: int) -> None:
+        """Add one to the co-occurrence count of other_id in the neighbours of movie_id."""
+        counts = self._extra_counts.setdefault(movie_id, {})
+        counts[other_id] = counts.get(other_id, 0) + 1
+
+    def save(self, index_file: str, sources: Optional[dict] = None) -> None:
+        """Save this index into a file at the given path, together with the keys of the source files it was built from
+        (see snapshot.source_key).
+
+        The overlay of reviews added after the index was built is not saved.
+        """
+        with open(index_file, 'wb') as file:
+            np.savez(file, top_n=np.array(self.top_n), movie_ids=self.movie_ids, offsets=self.offsets,
+                     neighbour_movies=self.neighbour_movies, neighbour_counts=self.neighbour_counts,
+                     sources=np.array(json.dumps(sources or {})))
+
+
+def build(user_movies: dict[int, Iterable[int]], top_n: int = 100,
+          max_pairs: int = PAIRS_PER_BLOCK) -> CooccurrenceIndex:
+    """Return a co-occurrence index built from a dictionary that maps each user id to their reviewed movie ids, keeping
+    the top_n neighbours of each movie.
+
+    The histories are stored as CSR arrays first (see csr_graph.adjacency_arrays). The counts are then accumulated
+    sparsely, one block of movies at a time: every (movie, other movie) pair of a user who reviewed a movie of the
+    block is listed, and equal pairs are counted by sorting them, or with a single bincount over the block when it is
+    dense enough, so the work is proportional to the number of pairs instead of the square of the number of movies.
+    Each block lists at most about max_pairs pairs, which bounds the memory used, and the top_n neighbours of its
+    movies are kept before the next block is counted.
+    """
+    _, movie_ids, user_offsets, user_movie_indexes, movie_offsets, movie_users = \
+        csr_graph.adjacency_arrays(user_movies)
+    num_movies = len(movie_ids)
+
+    # the number of pairs listed for each movie is the total length of the histories of its linked users
+    history_lengths = np.diff(user_offsets)
+    pair_offsets = np.zeros(len(movie_users) + 1, dtype=np.int64)
+    np.cumsum(history_lengths[movie_users], out=pair_offsets[1:])
+    movie_pairs = pair_offsets[movie_offsets]
+
+    offsets = np.zeros(num_movies + 1, dtype=np.int64)
+    neighbour_movies = []
+    neighbour_counts = []
+    first = 0
+
+    while first < num_movies:
+        last = max(first + 1, int(np.searchsorted(movie_pairs, movie_pairs[first] + max_pairs, side='right')) - 1)
+        last = min(last, num_movies)
+        rows, others, counts = _count_pairs(first, last, user_offsets, user_movie_indexes, movie_offsets,
+                                            movie_users, top_n)
+
+        neighbour_movies.append(movie_ids[others])
+        neighbour_counts.append(counts.astype(np.int32))
+        np.cumsum(np.bincount(rows, minlength=last - first), out=offsets[first + 1:last + 1])
+        offsets[first + 1:last + 1] += offsets[first]
+        first = last
+
+    return CooccurrenceIndex(top_n, movie_ids, offsets,
+                             np.concatenate(neighbour_movies) if neighbour_movies != [] else movie_ids[:0],
+                             np.concatenate(neighbour_counts) if neighbour_counts != [] else
+                             np.array([], dtype=np.int32))
+
+
+def _count_pairs(first: int, last: int, user_offsets: np.ndarray, user_movie_indexes: np.ndarray,
+                 movie_offsets: np.ndarray, movie_users: np.ndarray, top_n: int) -> tuple[np.ndarray, np.ndarray,
+                                                                                          np.ndarray]:
+    """Return the top_n co-occurring movies of each movie index from first to last (excluded), given the CSR arrays
+    of the histories, as three arrays: the row of each neighbour (its movie index minus first), the movie index of the
+    neighbour and its count, sorted by row, then by decreasing count, then by movie index.
+
+    >>> # user 0 reviewed movies 0 and 1, and user 1 reviewed movies 0, 1 and 2
+    >>> user_offsets, user_movie_indexes = np.array([0, 2, 5]), np.array([0, 1, 0, 1, 2])
+    >>> movie_offsets, movie_users = np.array([0, 2, 4, 5]), np.array([0, 1, 0, 1, 1])
+    >>> [array.tolist() for array in _count_pairs(0, 2, user_offsets, user_movie_indexes, movie_offsets,
+    ...                                           movie_users, 5)]
+    [[0, 0, 1, 1], [1, 2, 0, 2], [2, 1, 2, 1]]
+    """
+    users = movie_users[movie_offsets[first]:movie_offsets[last]]
+    user_rows = np.repeat(np.arange(last - first, dtype=np.int64), np.diff(movie_offsets[first:last + 1]))
+    lengths = user_offsets[users + 1] - user_offsets[users]
+
+    rows = np.repeat(user_rows, lengths)
+    others = user_movie_indexes[_gather(user_offsets, users)]
+    keep = others != rows + first
+    pairs = rows[keep] * len(movie_offsets) + others[keep]
+
+    if (last - first) * len(movie_offsets) <= 4 * len(pairs):
+        # the block is dense enough for a single bincount to cost no more than sorting the pairs
+        counts = np.bincount(pairs, minlength=(last - first) * len(movie_offsets))
+        pairs = np.flatnonzero(counts)
+        counts = counts[pairs]
+    else:
+        pairs, counts = np.unique(pairs, return_counts=True)
+    rows, others = np.divmod(pairs, len(movie_offsets))
+
+    # sort by row, then by decreasing count, then by movie index, with a single key
+    ceiling = int(counts.max(initial=0)) + 1
+    keys = np.sort((rows * ceiling + (ceiling - counts)) * len(movie_offsets) + others)
+    keys, others = np.divmod(keys, len(movie_offsets))
+    rows, counts = np.divmod(keys, ceiling)
+    counts = ceiling - counts
+    # the position of each neighbour among the neighbours of its movie
+    row_starts = np.searchsorted(rows, rows, side='left')
+    top = np.arange(len(rows)) - row_starts < top_n
+
+    return (rows[top], others[top], counts[top])
+
+
+def load(index_file: str, sources: Optional[dict[str, str]] = None) -> Optional[CooccurrenceIndex]:
+    """Return the index saved in the file at the given path.
+
+    If sources is given, it maps names to the paths of the source files the index should have been built from, and
+    None is returned if any of them has changed since the index was saved. None is also returned if there is no such
+    file.
+    """
+    if not os.path.exists(index_file):
+        return None
+
+    with np.load(index_file) as arrays:
+        saved_sources = json.loads(str(arrays['sources']))
+        if sources is not None and any(name not in saved_sources or not snapshot.is_fresh(saved_sources[name], path)
+                                       for name, path in sources.items()):
+            return None
+
+        return CooccurrenceIndex(int(arrays['top_n']), arrays['movie_ids'], arrays['offsets'],
+                                 arrays['neighbour_movies'], arrays['neighbour_counts'])
+
+
+def _gather(offsets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Return the positions of every item in the given rows of a CSR array with the given offsets."""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    row_starts = np.cumsum(lengths) - lengths
+
+    return np.repeat(starts - row_starts, lengths) + np.arange(lengths.sum())
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'numpy', 'csr_graph', 'snapshot'],
+        'allowed-io': ['save'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,317 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the CSRGraph class, a graph of users and movies that
+stores its edges in contiguous integer arrays instead of one Python object and
+one set per vertex. It can be used by the RecommendationSystem class in place
+of the User and Movie vertices for the full dataset.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+from array import array
+from typing import Iterable, Optional
+import numpy as np
+
+
+class CSRGraph:
+    """A bipartite graph of users and movies stored in compressed sparse row (CSR) form.
+
+    Users and movies are remapped to dense indexes 0, 1, 2, ... in the order they are added, in two separate index
+    spaces. The movies reviewed by the user with index u are user_movies[user_offsets[u]:user_offsets[u + 1]], and
+    the users linked to the movie with index m are movie_users[movie_offsets[m]:movie_offsets[m + 1]].
+
+    The arrays are built the first time the graph is queried. Edges added after that are kept in a small overlay
+    until compact is called, so adding a review does not rebuild the arrays.
+
+    Instance Attributes:
+        - user_ids: The user id of each user index.
+        - movie_ids: The movie id of each movie index.
+        - titles: The title of each movie index.
+        - genres: The genres of each movie index.
+        - avg_ratings: The average rating of each movie index.
+        - num_users: The number of users who rate each movie index.
+
+    Representation Invariants:
+        - len(self.user_ids) == len(self._user_index)
+        - len(self.movie_ids) == len(self._movie_index) == len(self.titles) == len(self.genres)
+        - len(self.avg_ratings) == len(self.num_users) == len(self.movie_ids)
+    """
+    user_ids: array
+    movie_ids: array
+    titles: list[str]
+    genres: list[list[str]]
+    avg_ratings: array
+    num_users: array
+    _user_index: dict[int, int]
+    _movie_index: dict[int, int]
+    _edge_users: array
+    _edge_movies: array
+    _user_offsets: Optional[np.ndarray]
+    _user_movies: Optional[np.ndarray]
+    _movie_offsets: Optional[np.ndarray]
+    _movie_users: Optional[np.ndarray]
+    _extra_user_movies: dict[int, list[int]]
+    _extra_movie_users: dict[int, list[int]]
+
+    def __init__(self) -> None:
+        """Initialize an empty graph (no vertices or edges)."""
+        self.user_ids = array('q')
+        self.movie_ids = array('q')
+        self.titles = []
+        self.genres = []
+        self.avg_ratings = array('d')
+        self.num_users = array('q')
+        self._user_index = {}
+        self._movie_index = {}
+        self._edge_users = array('i')
+        self._edge_movies = array('i')
+        self._user_offsets = None
+        self._user_movies = None
+        self._movie_offsets = None
+        self._movie_users = None
+        self._extra_user_movies = {}
+        self._extra_movie_users = {}
+
+    def add_user_vertex(self, user_id: int) -> None:
+        """Add a user vertex with the given user id to this graph.
+
+        Do nothing if the user is already in the graph.
+        """
+        if user_id not in self._user_index:
+            self._user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+
+    def add_movie_vertex(self, movie_id: int, title: str, avg_rating: float, num_users: int, genre: list[str] = None) \
+            -> None:
+        """Add a movie vertex with the given movie id and information to this graph.
+
+        If the movie is already in the graph, replace its information but keep its edges.
+        """
+        if movie_id in self._movie_index:
+            index = self._movie_index[movie_id]
+            self.titles[index] = title
+            self.genres[index] = genre
+            self.avg_ratings[index] = avg_rating
+            self.num_users[index] = num_users
+        else:
+            self._movie_index[movie_id] = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+            self.titles.append(title)
+            self.genres.append(genre)
+            self.avg_ratings.append(avg_rating)
+            self.num_users.append(num_users)
+
+    def add_edge(self, user_id: int, movie_id: int) -> None:
+        """Add an edge between the two vertices with the given user and movie ids in this graph.
+
+        Raise a ValueError if the user or the movie do not appear as vertices in this graph.
+        """
+        if user_id not in self._user_index or movie_id not in self._movie_index:
+            raise ValueError
+
+        user = self._user_index[user_id]
+        movie = self._movie_index[movie_id]
+
+        if self._user_offsets is None:
+            self._edge_users.append(user)
+            self._edge_movies.append(movie)
+        elif movie not in self.reviewed_movie_indexes(user):
+            self._extra_user_movies.setdefault(user, []).append(movie)
+            self._extra_movie_users.setdefault(movie, []).append(user)
+
+    def has_user(self, user_id: int) -> bool:
+        """Return whether the user with the given id is in this graph."""
+        return user_id in self._user_index
+
+    def has_movie(self, movie_id: int) -> bool:
+        """Return whether the movie with the given id is in this graph."""
+        return movie_id in self._movie_index
+
+    def user_index(self, user_id: int) -> int:
+        """Return the dense index of the user with the given id.
+
+        Preconditions:
+            - self.has_user(user_id)
+        """
+        return self._user_index[user_id]
+
+    def movie_index(self, movie_id: int) -> int:
+        """Return the dense index of the movie with the given id.
+
+        Preconditions:
+            - self.has_movie(movie_id)
+        """
+        return self._movie_index[movie_id]
+
+    def reviewed_movie_indexes(self, user: int) -> np.ndarray:
+        """Return an array of the indexes of the movies reviewed by the user with the given index."""
+        self.build()
+        movies = _slice(self._user_movies, self._user_offsets, user)
+
+        if user in self._extra_user_movies:
+            movies = np.concatenate((movies, np.array(self._extra_user_movies[user], dtype=np.int32)))
+
+        return movies
+
+    def linked_user_indexes(self, movie: int) -> np.ndarray:
+        """Return an array of the indexes of the users linked to the movie with the given index."""
+        self.build()
+        users = _slice(self._movie_users, self._movie_offsets, movie)
+
+        if movie in self._extra_movie_users:
+            users = np.concatenate((users, np.array(self._extra_movie_users[movie], dtype=np.int32)))
+
+        return users
+
+    def reviewed_movies(self, user_id: int) -> np.ndarray:
+        """Return an array of the ids of the movies reviewed by the user with the given id.
+
+        Preconditions:
+            - self.has_user(user_id)
+        """
+        movie_ids = np.frombuffer(self.movie_ids, dtype=np.int64)
+        return movie_ids[self.reviewed_movie_indexes(self._user_index[user_id])]
+
+    def linked_users(self, movie_id: int) -> np.ndarray:
+        """Return an array of the ids of the users linked to the movie with the given id.
+
+        Preconditions:
+            - self.has_movie(movie_id)
+        """
+        user_ids = np.frombuffer(self.user_ids, dtype=np.int64)
+        return user_ids[self.linked_user_indexes(self._movie_index[movie_id])]
+
+    def count_linked_users(self, movie_ids: list[int]) -> tuple[np.ndarray, np.ndarray]:
+        """Return an array of the ids of the users linked to at least one of the movies with the given ids, and an
+        array of how many of those movies each of these users is linked to.
+
+        Only the adjacency of the given movies is read, so the cost depends on their number of linked users rather
+        than on the total number of users.
+
+        Preconditions:
+            - all(self.has_movie(movie_id) for movie_id in movie_ids)
+        """
+        users = [self.linked_user_indexes(self._movie_index[movie_id]) for movie_id in movie_ids]
+        indexes, counts = np.unique(np.concatenate(users) if users != [] else np.array([], dtype=np.int32),
+                                    return_counts=True)
+
+        return (np.frombuffer(self.user_ids, dtype=np.int64)[indexes], counts)
+
+    def num_edges(self) -> int:
+        """Return the number of distinct edges in this graph."""
+        self.build()
+        return len(self._user_movies) + sum(len(movies) for movies in self._extra_user_movies.values())
+
+    def build(self) -> None:
+        """Build the adjacency arrays from the edges added so far if they have not been built yet.
+
+        Duplicate edges are only kept once.
+        """
+        if self._user_offsets is not None:
+            return
+
+        num_users = len(self.user_ids)
+        num_movies = len(self.movie_ids)
+        keys = np.unique(np.frombuffer(self._edge_users, dtype=np.int32).astype(np.int64) * max(num_movies, 1)
+                         + np.frombuffer(self._edge_movies, dtype=np.int32))
+        edge_users = (keys // max(num_movies, 1)).astype(np.int32)
+        edge_movies = (keys % max(num_movies, 1)).astype(np.int32)
+
+        # the unique keys are sorted by user first, so the edges are already grouped by user
+        self._user_offsets = _offsets(edge_users, num_users)
+        self._user_movies = edge_movies
+
+        order = np.argsort(edge_movies, kind='stable')
+        self._movie_offsets = _offsets(edge_movies, num_movies)
+        self._movie_users = edge_users[order]
+
+        self._edge_users = array('i')
+        self._edge_movies = array('i')
+
+    def compact(self) -> None:
+        """Fold the edges added since the adjacency arrays were built into the arrays themselves."""
+        if self._user_offsets is None:
+            return
+
+        edge_users = np.repeat(np.arange(len(self._user_offsets) - 1, dtype=np.int32), np.diff(self._user_offsets))
+        self._edge_users = array('i', edge_users.tobytes())
+        self._edge_movies = array('i', self._user_movies.tobytes())
+
+        for user, movies in self._extra_user_movies.items():
+            for movie in movies:
+                self._edge_users.append(user)
+                self._edge_movies.append(movie)
+
+        self._user_offsets = None
+        self._extra_user_movies = {}
+        self._extra_movie_users = {}
+        self.build()
+
+
+def adjacency_arrays(user_movies: dict[int, Iterable[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+                                                                      np.ndarray, np.ndarray]:
+    """Return the arrays of a CSRGraph built from a dictionary that maps each user id to their reviewed movie ids,
+    without adding the vertices and edges one by one:
+        - the user id of each user index
+        - the movie id of each movie index, sorted
+        - the user offsets and the reviewed movie indexes of each user (CSR)
+        - the movie offsets and the linked user indexes of each movie (CSC)
+    """
+    histories = [np.unique(np.fromiter(movies, dtype=np.int64)) for movies in user_movies.values()]
+    user_ids = np.fromiter(user_movies, dtype=np.int64, count=len(user_movies))
+    all_movies = np.concatenate(histories) if histories != [] else np.array([], dtype=np.int64)
+    movie_ids, user_movie_indexes = np.unique(all_movies, return_inverse=True)
+    user_movie_indexes = user_movie_indexes.astype(np.int32).reshape(-1)
+
+    user_offsets = np.zeros(len(histories) + 1, dtype=np.int64)
+    np.cumsum([len(history) for history in histories], out=user_offsets[1:])
+    edge_users = np.repeat(np.arange(len(histories), dtype=np.int32), np.diff(user_offsets))
+
+    order = np.argsort(user_movie_indexes, kind='stable')
+    movie_offsets = _offsets(user_movie_indexes, len(movie_ids))
+
+    return (user_ids, movie_ids, user_offsets, user_movie_indexes, movie_offsets, edge_users[order])
+
+
+def _slice(adjacency: np.ndarray, offsets: np.ndarray, index: int) -> np.ndarray:
+    """Return the neighbours of the vertex with the given index in the given adjacency array, or an empty array if the
+    vertex was added after the array was built.
+    """
+    if index + 1 >= len(offsets):
+        return adjacency[:0]
+
+    return adjacency[offsets[index]:offsets[index + 1]]
+
+
+def _offsets(sorted_indexes: np.ndarray, size: int) -> np.ndarray:
+    """Return an array of size + 1 offsets such that the items equal to i in the given array are found between
+    offsets[i] and offsets[i + 1] once the array is sorted.
+    """
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sorted_indexes, minlength=size), out=offsets[1:])
+
+    return offsets
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['array', 'numpy'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,247 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the Dataset class, which reads the movie and rating
+files once and keeps the indexes and views derived from them, so that the
+recommendation system and the interface do not need to parse the files again
+for every query.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import heapq
+from typing import Iterable, Iterator, Optional
+import numpy as np
+import file_reading, parallel_reading, title_index
+
+
+class Dataset:
+    """The parsed contents of a movie file and a rating file.
+
+    The files are only read the first time one of the views is needed, and every view is computed at most once until
+    the dataset is invalidated. Reading the files only joins the movies with their linked users; the movie_users and
+    user_movies views, which hold another copy of every rating, are only built when they are asked for.
+
+    Instance Attributes:
+        - movie_file: The path of the movie file this dataset is read from.
+        - rating_file: The path of the rating file this dataset is read from.
+        - workers: The number of worker processes the files are read with, or None to choose it from the size of the
+          rating file (see parallel_reading.workers_for).
+    """
+    movie_file: str
+    rating_file: str
+    workers: Optional[int]
+    _movies: Optional[list]
+    _movie_users: Optional[dict[int, set[int]]]
+    _user_movies: Optional[dict[int, set[int]]]
+    _title_id: Optional[dict[str, int]]
+    _genres: Optional[set[str]]
+    _popular: Optional[list[str]]
+    _titles: Optional[title_index.TitleIndex]
+    _last_movie_id: Optional[int]
+    _last_user_id: Optional[int]
+    _review_seq: int
+
+    def __init__(self, movie_file: str, rating_file: str, workers: Optional[int] = None) -> None:
+        """Initialize a dataset for the given files, read with the given number of worker processes, without reading
+        them yet.
+        """
+        self.movie_file = movie_file
+        self.rating_file = rating_file
+        self.workers = workers
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Discard everything read from the files, so that they are read again the next time a view is needed.
+
+        This must be called whenever the movie file or the rating file changes on disk.
+        """
+        self._movies = None
+        self._movie_users = None
+        self._user_movies = None
+        self._title_id = None
+        self._genres = None
+        self._popular = None
+        self._titles = None
+        self._last_movie_id = None
+        self._last_user_id = None
+        self._review_seq = 0
+
+    def is_for(self, movie_file: str, rating_file: str) -> bool:
+        """Return whether this dataset is read from the given movie file and rating file."""
+        return self.movie_file == movie_file and self.rating_file == rating_file
+
+    def is_loaded(self) -> bool:
+        """Return whether the contents of the files are currently held by this dataset."""
+        return self._movies is not None
+
+    def _load(self) -> list:
+        """Read both files once if they have not been read yet and return the movies with their linked users.
+
+        The rating file is streamed in chunks (see file_reading.rating_chunks), so its rows are never all held at once,
+        or with more than one worker, parsed in parallel with the movie file (see parallel_reading.read_files). The
+        peak memory still grows with the number of ratings, since every linked user id is kept as a Python integer
+        (see file_reading.combine_chunks).
+        """
+        if self._movies is None:
+            workers = parallel_reading.workers_for(self.rating_file, self.workers)
+
+            if workers == 1:
+                movies = [movie for chunk in file_reading.movie_chunks(self.movie_file) for movie in chunk]
+                chunks = file_reading.rating_chunks(self.rating_file)
+            else:
+                movies, chunks = parallel_reading.read_files(self.movie_file, self.rating_file, workers)
+
+            self._genres = {genre for movie in movies for genre in movie[2]}
+            self._last_movie_id = movies[-1][0] if movies != [] else 0
+            self._last_user_id = 0
+            self._movies = file_reading.combine_chunks(movies, self._rating_chunks(chunks))
+
+        return self._movies
+
+    def _rating_chunks(self, chunks: Iterable[tuple[np.ndarray, np.ndarray]]) -> \
+            Iterator[tuple[np.ndarray, np.ndarray]]:
+        """Yield the given chunks of ratings of the rating file, recording the user id of the last rating."""
+        for user_ids, movie_ids in chunks:
+            if len(user_ids) > 0:
+                self._last_user_id = int(user_ids[-1])
+            yield (user_ids, movie_ids)
+
+    def restore(self, movies: list, genres: set[str], last_movie_id: int, last_user_id: int,
+                review_seq: int = 0) -> None:
+        """Fill this dataset with contents that were read from its files earlier, such as from a snapshot, instead of
+        reading the files again.
+
+        The given movies are in the same format as file_reading.combined_files. They already include the reviews of the
+        review log up to the sequence number review_seq.
+        """
+        self._review_seq = review_seq
+        self._genres = genres
+        self._popular = None
+        self._titles = None
+        self._last_movie_id = last_movie_id
+        self._last_user_id = last_user_id
+        self._movies = movies
+        self._movie_users = None
+        self._user_movies = None
+        self._title_id = None
+
+    def movies(self) -> list:
+        """Return the list of movies with their linked users, like file_reading.combined_files.
+
+        The returned list is shared, so it must not be mutated.
+        """
+        return self._load()
+
+    def movie_users(self) -> dict[int, set[int]]:
+        """Return a dictionary that maps each movie id to a set of linked user ids."""
+        if self._movie_users is None:
+            self._movie_users = file_reading.movie_users_index(self.movies())
+
+        return self._movie_users
+
+    def user_movies(self) -> dict[int, set[int]]:
+        """Return a dictionary that maps each user id to a set of reviewed movie ids."""
+        if self._user_movies is None:
+            self._user_movies = file_reading.user_movies_index(self.movies())
+
+        return self._user_movies
+
+    def title_id(self) -> dict[str, int]:
+        """Return a dictionary that maps each movie title to its id."""
+        if self._title_id is None:
+            self._title_id = file_reading.title_ids(self.movies())
+
+        return self._title_id
+
+    def titles(self) -> title_index.TitleIndex:
+        """Return an index that maps each movie title to its id and each movie id to its title."""
+        if self._titles is None:
+            self._titles = title_index.TitleIndex(self.title_id())
+
+        return self._titles
+
+    def genres(self) -> set[str]:
+        """Return a set of all possible genres in the movie file, like file_reading.return_genres."""
+        self._load()
+        return self._genres
+
+    def last_movie_id(self) -> int:
+        """Return the id of the last movie in the movie file."""
+        self._load()
+        return self._last_movie_id
+
+    def last_user_id(self) -> int:
+        """Return the id of the user in the last rating of the rating file."""
+        self._load()
+        return self._last_user_id
+
+    def review_seq(self) -> int:
+        """Return the sequence number of the last review of the review log that is already included in this dataset,
+        or 0 if there is none.
+        """
+        return self._review_seq
+
+    def popular_movies(self) -> list[str]:
+        """Return a list of 50 most popular movies, like computation.popular_movies.
+
+        The popularity of a movie is defined as its average rating, and only the movies with 30 or more user ratings
+        will be considered.
+        """
+        if self._popular is None:
+            more_than_30_votes = [[movie[1], movie[3]] for movie in self.movies() if movie[4] >= 30]
+            self._popular = [curr_movie[0] for curr_movie in heapq.nlargest(50, more_than_30_votes,
+                                                                            key=lambda x: x[1])]
+
+        return self._popular
+
+
+_LOADED: dict[tuple[str, str], Dataset] = {}
+
+
+def load(movie_file: str, rating_file: str, workers: Optional[int] = None) -> Dataset:
+    """Return the dataset for the given files, sharing the same Dataset between every caller that asks for the same
+    files.
+
+    If the number of worker processes is given, the files are read with it the next time they are read.
+    """
+    if (movie_file, rating_file) not in _LOADED:
+        _LOADED[(movie_file, rating_file)] = Dataset(movie_file, rating_file)
+
+    if workers is not None:
+        _LOADED[(movie_file, rating_file)].workers = workers
+
+    return _LOADED[(movie_file, rating_file)]
+
+
+def invalidate(movie_file: Optional[str] = None, rating_file: Optional[str] = None) -> None:
+    """Invalidate every loaded dataset that is read from the given movie file or rating file.
+
+    Invalidate all loaded datasets if no file is given.
+    """
+    for key in _LOADED:
+        if (movie_file is None and rating_file is None) or movie_file == key[0] or rating_file == key[1]:
+            _LOADED[key].invalidate()
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['file_reading', 'heapq', 'numpy', 'parallel_reading', 'title_index'],
+        'max-line-length': 120
+    })
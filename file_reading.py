@@ -6,6 +6,17 @@ Content and Information
 This module contains functions that read and clean the datasets and sort
 them into forms that allow the computation processes to be easier.
 
+The rating file can also be streamed: movie_chunks and rating_chunks read the
+files a chunk of rows at a time, only parse the columns that are used into
+compact dtypes, and filter each chunk with vectorized operations, so that
+combine_chunks can join the movies with their ratings without ever holding
+every row of the file at once.
+
+Streaming only bounds the memory used for parsing. The joined movies keep every
+linked user id of every rating as a Python integer, so the memory they take
+still grows with the number of ratings, and so does the memory of the
+movie_users_index and user_movies_index built from them.
+
 Copyright and Usage Information
 ===============================
 
@@ -17,9 +28,25 @@ expressly prohibited.
 This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 """
 import ast
+import re
+import sys
+from typing import Iterable, Iterator
+import numpy as np
 import pandas as pd
+import instrumentation
+
+# The number of rows read at a time when streaming the movie file and the rating file
+MOVIE_CHUNK_SIZE = 10_000
+RATING_CHUNK_SIZE = 1_000_000
+
+# Matches the name of each genre in the genres column, such as "[{'id': 16, 'name': 'Animation'}]"
+_GENRE_NAME = re.compile(r"'name': '([^'\\]*)'")
+
+# Maps each genres string already parsed to its genre names, since most movies share a few combinations of genres
+_PARSED_GENRES: dict[str, tuple[str, ...]] = {}
 
 
+@instrumentation.timed('parse_movies')
 def movie_file_reading(movie_file: str) -> list:
     """Read the movie file given and clean the dataset to obtain the columns we are using, which include id, title,
     genres, vote_count, and vote_average.
@@ -35,7 +62,7 @@ def movie_file_reading(movie_file: str) -> list:
     for row in df.itertuples():
         curr_id = -1 * int(row.id)
         title = str(row.title)
-        genres = [curr_genre['name'] for curr_genre in ast.literal_eval(row.genres)]
+        genres = parse_genres(row.genres)
         vote_avg = row.vote_average
         vote_count = int(row.vote_count)
         movie_text.append([curr_id, title, genres, vote_avg, vote_count])
@@ -43,6 +70,7 @@ def movie_file_reading(movie_file: str) -> list:
     return movie_text
 
 
+@instrumentation.timed('parse_ratings')
 def rating_file_reading(rating_file: str) -> list:
     """Read and claen the rating file given to obtain the columns we are using, which include userId, movieId,
     and rating.
@@ -64,96 +92,236 @@ def rating_file_reading(rating_file: str) -> list:
     return rating_text
 
 
-def combined_files(movie_file: str, rating_file: str) -> list:
-    """Return a list of movies like movie_file_reading but with an additional column that contains a list of linked
-    users.
+def parse_genres(genres: str) -> list[str]:
+    """Return the list of genre names in the given value of the genres column of the movie file.
 
-    The movies that do not have user reviews are excluded from the list.
+    The names are matched with a regular expression instead of evaluating the whole value as a Python literal, and
+    each distinct value is only parsed once. The names are interned, so the movies of a genre share the same string.
+    A value that the expression does not fully match, such as one with double quotes, is evaluated as a literal instead.
+
+    >>> parse_genres("[{'id': 16, 'name': 'Animation'}, {'id': 35, 'name': 'Comedy'}]")
+    ['Animation', 'Comedy']
+    >>> parse_genres('[{"id": 10751, "name": "Family"}]')
+    ['Family']
+    >>> parse_genres('[]')
+    []
     """
-    movies = movie_file_reading(movie_file)
-    users = rating_file_reading(rating_file)
+    if genres not in _PARSED_GENRES:
+        names = _GENRE_NAME.findall(genres)
+        if len(names) != genres.count("'id'") + genres.count('"id"'):
+            names = [curr_genre['name'] for curr_genre in ast.literal_eval(genres)]
 
-    for movie in movies:
-        viewed_users = []
-        for user in users:
-            if user[1] == int(movie[0]):
-                viewed_users.append(user[0])
+        _PARSED_GENRES[genres] = tuple(sys.intern(name) for name in names)
 
-        movie.append(viewed_users)
+    return list(_PARSED_GENRES[genres])
 
-    return_list = [curr_movie for curr_movie in movies if curr_movie[5] != []]
 
-    return return_list
+def movie_chunks(movie_file: str, chunk_size: int = MOVIE_CHUNK_SIZE) -> Iterator[list]:
+    """Yield the movies returned by movie_file_reading in lists of at most chunk_size movies, reading the movie file
+    chunk_size rows at a time.
 
+    Every column is still read, because a movie with a missing value in any column is filtered out like in
+    movie_file_reading, but only the used columns are converted into Python values.
+    """
+    reader = iter(pd.read_csv(movie_file, dtype={'popularity': str}, chunksize=chunk_size))
 
-def movie_users(movie_file: str, rating_file: str) -> dict[int, set[int]]:
-    """Return a dictionary that maps each movie id to a set of linked user ids. The movies that do not have user reviews
-    are excluded from the dictionary.
+    while True:
+        with instrumentation.span('parse_movies'):
+            df = next(reader, None)
+            if df is None:
+                return
+
+            df = df.dropna()
+            df = df[df['vote_average'] >= 5.0]
+            chunk = [[-1 * int(curr_id), str(title), parse_genres(genres), vote_avg, int(vote_count)]
+                     for curr_id, title, genres, vote_avg, vote_count in zip(df['id'], df['title'], df['genres'],
+                                                                             df['vote_average'], df['vote_count'])]
+
+        yield chunk
+
+
+def rating_chunks(rating_file: str, chunk_size: int = RATING_CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Yield the ratings returned by rating_file_reading as pairs of arrays of user ids and (negated) movie ids, reading
+    the rating file chunk_size rows at a time.
+
+    Only the userId, movieId and rating columns are read, and the ratings less than 3.0 out of 5.0 are filtered out of
+    each chunk with vectorized operations. The ids are yielded as 32-bit integers, but only converted after the rows
+    with missing values are dropped, since the nullable integer dtypes of pandas are several times slower to parse.
+
+    Reading and filtering each chunk is measured as a call of the parse_ratings stage (see instrumentation), without
+    the time the caller spends on the chunk.
     """
-    movies = combined_files(movie_file, rating_file)
-    ratings = rating_file_reading(rating_file)
+    reader = iter(pd.read_csv(rating_file, usecols=['userId', 'movieId', 'rating'], dtype={'rating': np.float32},
+                              chunksize=chunk_size))
 
-    movie_users_dict = {}
+    while True:
+        with instrumentation.span('parse_ratings'):
+            df = next(reader, None)
+            if df is None:
+                return
 
-    for movie in movies:
-        viewed_users = set()
+            df = df.dropna()
+            df = df[df['rating'] >= 3.0]
+            chunk = (df['userId'].to_numpy(np.int32), -1 * df['movieId'].to_numpy(np.int32))
 
-        for rating in ratings:
-            if rating[1] == movie[0]:
-                viewed_users.add(rating[0])
+        yield chunk
 
-        movie_users_dict[movie[0]] = viewed_users
 
-    return movie_users_dict
+def index_chunks(movies: list, chunks: Iterable[tuple[np.ndarray, np.ndarray]]) -> \
+        tuple[list, dict[int, set[int]], dict[int, set[int]], dict[str, int]]:
+    """Return the same four indexes as index_rows, built from the movies returned by movie_file_reading and the chunks
+    of ratings yielded by rating_chunks.
+    """
+    return index_combined(combine_chunks(movies, chunks))
 
 
-def user_movies(movie_file: str, rating_file: str) -> dict[int, set[int]]:
-    """Return a dictionary that maps each user id to a set of reviewed movie ids. The users who do not have movie
-    reviews are excluded from the dictionary.
+def combine_chunks(movies: list, chunks: Iterable[tuple[np.ndarray, np.ndarray]]) -> list:
+    """Return the list of movies like combined_files, built from the movies returned by movie_file_reading and the
+    chunks of ratings yielded by rating_chunks.
+
+    Each chunk is grouped by movie id with a stable sort and appended to the linked users of its movies before the next
+    chunk is read, so the linked users are in the same order as with index_rows.
     """
-    movies = movie_users(movie_file, rating_file)
-    ratings = rating_file_reading(rating_file)
+    movie_ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+    linked_users = {}
+
+    for user_ids, rated_movies in chunks:
+        with instrumentation.span('join'):
+            known = np.isin(rated_movies, movie_ids)
+            order = np.argsort(rated_movies[known], kind='stable')
+            sorted_movies = rated_movies[known][order]
+            sorted_users = user_ids[known][order].tolist()
+            starts = np.flatnonzero(np.diff(sorted_movies, prepend=sorted_movies[:1] - 1)).tolist()
+
+            for start, end in zip(starts, starts[1:] + [len(sorted_users)]):
+                linked_users.setdefault(int(sorted_movies[start]), []).extend(sorted_users[start:end])
+
+    with instrumentation.span('join'):
+        return _combine(movies, linked_users)
+
+
+def index_files(movie_file: str, rating_file: str) -> tuple[list, dict[int, set[int]], dict[int, set[int]],
+                                                             dict[str, int]]:
+    """Read each of the given files once and return a tuple of four indexes built from them in a single pass:
+        - the list of movies like combined_files
+        - a dictionary that maps each movie id to a set of linked user ids
+        - a dictionary that maps each user id to a set of reviewed movie ids
+        - a dictionary that maps each movie title to its id
+
+    The ratings are grouped by movie id in a dictionary first, so every movie and every rating is visited only once
+    instead of comparing each movie with each rating.
+    """
+    return index_rows(movie_file_reading(movie_file), rating_file_reading(rating_file))
 
-    user_movies_dict = {}
-    curr_user_id = None
+
+@instrumentation.timed('join')
+def index_rows(movies: list, ratings: list) -> tuple[list, dict[int, set[int]], dict[int, set[int]], dict[str, int]]:
+    """Return the same four indexes as index_files, built from rows already returned by movie_file_reading and
+    rating_file_reading.
+
+    The movie rows that have user reviews are extended with their list of linked users.
+    """
+    movie_ids = {movie[0] for movie in movies}
+    linked_users = {}
 
     for rating in ratings:
-        if curr_user_id != rating[0]:
-            viewed_movies = set()
+        if rating[1] in movie_ids:
+            linked_users.setdefault(rating[1], []).append(rating[0])
+
+    return index_combined(_combine(movies, linked_users))
+
+
+def _combine(movies: list, linked_users: dict[int, list[int]]) -> list:
+    """Return the list of movies like combined_files, given the movies and the linked users of each movie id.
+
+    The lists of linked users are moved into the movies instead of being copied, so linked_users must not be used
+    afterwards.
+    """
+    combined = []
+
+    for movie in movies:
+        if movie[0] in linked_users:
+            movie.append(linked_users[movie[0]])
+            combined.append(movie)
+
+    return combined
+
 
-            add_viewed_movies(movies, curr_user_id, viewed_movies)
+def index_combined(combined: list) -> tuple[list, dict[int, set[int]], dict[int, set[int]], dict[str, int]]:
+    """Return the same four indexes as index_files, built from a list of movies in the format of combined_files.
+    """
+    return (combined, movie_users_index(combined), user_movies_index(combined), title_ids(combined))
 
-            if viewed_movies != set():
-                user_movies_dict[curr_user_id] = viewed_movies
 
-        curr_user_id = rating[0]
+def movie_users_index(combined: list) -> dict[int, set[int]]:
+    """Return a dictionary that maps each movie id to a set of linked user ids, built from a list of movies in the
+    format of combined_files.
+    """
+    movie_users_dict = {}
+
+    for movie in combined:
+        movie_users_dict.setdefault(movie[0], set()).update(movie[5])
+
+    return movie_users_dict
+
+
+def user_movies_index(combined: list) -> dict[int, set[int]]:
+    """Return a dictionary that maps each user id to a set of reviewed movie ids, built from a list of movies in the
+    format of combined_files.
+    """
+    user_movies_dict = {}
+
+    for movie in combined:
+        for user_id in movie[5]:
+            user_movies_dict.setdefault(user_id, set()).add(movie[0])
 
     return user_movies_dict
 
 
-def add_viewed_movies(movies: dict[int, set[int]], curr_user_id: int, viewed_movies: set[int]) -> None:
-    """Add movies into the user's viewed movies list if the movie is rated by the user.
+def title_ids(combined: list) -> dict[str, int]:
+    """Return a dictionary that maps each movie title to its id, built from a list of movies in the format of
+    combined_files.
     """
-    for movie in movies:
-        if curr_user_id in movies[movie]:
-            viewed_movies.add(movie)
+    return {movie[1]: movie[0] for movie in combined}
+
+
+def combined_files(movie_file: str, rating_file: str) -> list:
+    """Return a list of movies like movie_file_reading but with an additional column that contains a list of linked
+    users.
+
+    The movies that do not have user reviews are excluded from the list.
+    """
+    return index_files(movie_file, rating_file)[0]
+
+
+def movie_users(movie_file: str, rating_file: str) -> dict[int, set[int]]:
+    """Return a dictionary that maps each movie id to a set of linked user ids. The movies that do not have user reviews
+    are excluded from the dictionary.
+    """
+    return index_files(movie_file, rating_file)[1]
+
+
+def user_movies(movie_file: str, rating_file: str) -> dict[int, set[int]]:
+    """Return a dictionary that maps each user id to a set of reviewed movie ids. The users who do not have movie
+    reviews are excluded from the dictionary.
+    """
+    return index_files(movie_file, rating_file)[2]
 
 
 def movie_title_id(movie_file: str, rating_file: str) -> dict[str, int]:
     """Return a dictionary that maps each movie title to its id.
     """
-    return {movie[1]: movie[0] for movie in combined_files(movie_file, rating_file)}
+    return index_files(movie_file, rating_file)[3]
 
 
 def return_genres(movie_file: str) -> set:
     """Return a list of all possible genres in the dataset.
     """
-    movies = movie_file_reading(movie_file)
     genres = set()
 
-    for movie in movies:
-        for genre in movie[2]:
-            genres.add(genre)
+    for chunk in movie_chunks(movie_file):
+        for movie in chunk:
+            genres.update(movie[2])
 
     return genres
 
@@ -165,7 +333,7 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['ast', 'pandas'],
-        'allowed-io': ['movie_file_reading', 'rating_file_reading'],
+        'extra-imports': ['ast', 're', 'sys', 'numpy', 'pandas', 'instrumentation'],
+        'allowed-io': ['movie_file_reading', 'rating_file_reading', 'movie_chunks', 'rating_chunks'],
         'max-line-length': 120
     })
@@ -0,0 +1,148 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the GenreIndex class, a vocabulary of the genre names
+with an interned id for each genre, which stores the genres of every movie as
+a bitmask over those ids and the movies of every genre as an inverted index.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+from typing import Iterable, Optional
+
+
+class GenreIndex:
+    """The genres of a set of movies, as bitmasks over a vocabulary of interned genre ids.
+
+    Checking whether a movie belongs to a genre is a single bit test, finding the movies of a genre is a dictionary
+    lookup, and listing the genre names reuses a list that is only sorted again when a new genre is added.
+
+    >>> index = GenreIndex(['Drama'])
+    >>> index.add(-1, ['Comedy', 'Drama'])
+    >>> index.has_genre(-1, 'Drama'), index.has_genre(-1, 'Horror')
+    (True, False)
+    >>> index.names()
+    ['Comedy', 'Drama']
+    >>> index.genres_of(-1)
+    ['Drama', 'Comedy']
+
+    Representation Invariants:
+        - all(self._ids[name] == i for i, name in enumerate(self._names))
+        - all(movie_id in self._movies[i] for movie_id in self._masks for i in range(len(self._names))
+              if self._masks[movie_id] >> i & 1)
+    """
+    _ids: dict[str, int]
+    _names: list[str]
+    _masks: dict[int, int]
+    _movies: list[set[int]]
+    _sorted_names: Optional[list[str]]
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        """Initialize an index without movies whose vocabulary has the given genre names."""
+        self._ids = {}
+        self._names = []
+        self._masks = {}
+        self._movies = []
+        self._sorted_names = None
+
+        for name in names:
+            self.genre_id(name)
+
+    def genre_id(self, name: str) -> int:
+        """Return the interned id of the genre with the given name, adding it to the vocabulary if it is new."""
+        if name not in self._ids:
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._movies.append(set())
+            self._sorted_names = None
+
+        return self._ids[name]
+
+    def mask(self, genres: Iterable[str]) -> int:
+        """Return the bitmask of the given genre names, adding the new ones to the vocabulary."""
+        result = 0
+        for name in genres:
+            result |= 1 << self.genre_id(name)
+
+        return result
+
+    def add(self, movie_id: int, genres: Optional[Iterable[str]]) -> None:
+        """Record the given genres as the genres of the movie with the given id, replacing its previous genres."""
+        self.remove(movie_id)
+        self._masks[movie_id] = self.mask(genres or [])
+
+        for genre in self._bits(self._masks[movie_id]):
+            self._movies[genre].add(movie_id)
+
+    def remove(self, movie_id: int) -> None:
+        """Remove the movie with the given id from this index, if it is in it."""
+        for genre in self._bits(self._masks.pop(movie_id, 0)):
+            self._movies[genre].discard(movie_id)
+
+    def has_genre(self, movie_id: int, genre: str) -> bool:
+        """Return whether the movie with the given id belongs to the genre with the given name."""
+        return genre in self._ids and self._masks.get(movie_id, 0) >> self._ids[genre] & 1 == 1
+
+    def genres_of(self, movie_id: int) -> list[str]:
+        """Return the names of the genres of the movie with the given id, in the order they were added to the
+        vocabulary.
+        """
+        return [self._names[genre] for genre in self._bits(self._masks.get(movie_id, 0))]
+
+    def movies(self, genre: str) -> set[int]:
+        """Return the set of ids of the movies that belong to the genre with the given name.
+
+        The returned set is shared, so it must not be mutated.
+        """
+        return self._movies[self._ids[genre]] if genre in self._ids else set()
+
+    def names(self) -> list[str]:
+        """Return the names of every genre in the vocabulary in alphabetical order.
+
+        The returned list is shared, so it must not be mutated.
+        """
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._names)
+
+        return self._sorted_names
+
+    def __contains__(self, genre: str) -> bool:
+        """Return whether the genre with the given name is in the vocabulary."""
+        return genre in self._ids
+
+    @staticmethod
+    def _bits(mask: int) -> list[int]:
+        """Return the ids of the genres in the given bitmask, from the lowest to the highest.
+
+        >>> GenreIndex._bits(0b1010)
+        [1, 3]
+        """
+        result = []
+        while mask != 0:
+            lowest = mask & -mask
+            result.append(lowest.bit_length() - 1)
+            mask ^= lowest
+
+        return result
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120
+    })
@@ -0,0 +1,310 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the instrumentation of the hot stages of the
+recommendation system: parsing the CSV files, joining movies with their
+ratings, building the graph and answering queries and reviews.
+
+Each stage is measured by a span, which counts its calls and adds their
+duration to a latency histogram with power-of-two buckets, and optionally
+records the peak memory allocated during the call with tracemalloc. The
+measurements can be exported as JSON or as a text table. The time of a stage
+includes the stages it calls, such as parse_ratings and join when
+add_movies_users reads the files.
+
+The instrumentation is off by default. While it is off, a span only checks a
+flag, so leaving the spans in the hot stages costs almost nothing.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+# The number of buckets of each latency histogram: bucket i counts the calls that took less than 2 ** i microseconds
+# (and at least 2 ** (i - 1)), and the last bucket also counts every longer call
+NUM_BUCKETS = 40
+
+
+class StageStats:
+    """The measurements of one stage.
+
+    Instance Attributes:
+        - name: The name of the stage.
+        - calls: The number of calls of the stage.
+        - total: The total duration of the calls in seconds.
+        - longest: The duration of the longest call in seconds.
+        - buckets: The latency histogram of the calls (see NUM_BUCKETS).
+        - peak_memory: The most memory allocated during a single call in bytes, or None if it was not traced.
+
+    Representation Invariants:
+        - self.calls == sum(self.buckets)
+        - len(self.buckets) == NUM_BUCKETS
+    """
+    name: str
+    calls: int
+    total: float
+    longest: float
+    buckets: list[int]
+    peak_memory: Optional[int]
+
+    def __init__(self, name: str) -> None:
+        """Initialize the measurements of a stage with the given name that was never called."""
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.buckets = [0] * NUM_BUCKETS
+        self.peak_memory = None
+
+    def record(self, seconds: float, peak_memory: Optional[int]) -> None:
+        """Record a call of this stage that took the given number of seconds and allocated at most peak_memory bytes.
+        """
+        self.calls += 1
+        self.total += seconds
+        self.longest = max(self.longest, seconds)
+        self.buckets[min(NUM_BUCKETS - 1, int(seconds * 1_000_000).bit_length())] += 1
+
+        if peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, peak_memory)
+
+    def percentile(self, percent: float) -> float:
+        """Return an upper bound of the given percentile of the call durations in seconds, from the histogram.
+
+        >>> stats = StageStats('parse')
+        >>> for seconds in [0.001, 0.001, 0.001, 0.5]:
+        ...     stats.record(seconds, None)
+        >>> stats.percentile(50)
+        0.001024
+        >>> stats.percentile(100) == stats.longest
+        True
+        """
+        rank = max(1, int(-(-self.calls * percent // 100)))
+        seen = 0
+
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(2 ** i / 1_000_000, self.longest)
+
+        return self.longest
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the measurements of this stage as a dictionary that can be saved as JSON, with durations in
+        milliseconds.
+        """
+        return {
+            'calls': self.calls,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total * 1000 / max(1, self.calls),
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.longest * 1000,
+            'peak_memory_bytes': self.peak_memory,
+            'buckets': {f'<{2 ** i}us': count for i, count in enumerate(self.buckets) if count > 0}
+        }
+
+
+class _Span:
+    """A context manager that measures one call of a stage."""
+    _name: str
+    _start: float
+    _memory: Optional[list[int]]
+
+    def __init__(self, name: str) -> None:
+        """Initialize a span of the stage with the given name."""
+        self._name = name
+        self._memory = None
+
+    def __enter__(self) -> _Span:
+        """Start measuring the stage."""
+        if _TRACE_MEMORY and tracemalloc.is_tracing():
+            # the current memory at the start, and the highest peak reached by the spans nested in this one
+            self._memory = [tracemalloc.get_traced_memory()[0], 0]
+            _memory_frames().append(self._memory)
+            tracemalloc.reset_peak()
+
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop measuring the stage and record its measurements."""
+        seconds = time.perf_counter() - self._start
+        peak_memory = None
+
+        if self._memory is not None:
+            frames = _memory_frames()
+            frames.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], self._memory[1])
+            peak_memory = peak - self._memory[0]
+            if frames != []:
+                frames[-1][1] = max(frames[-1][1], peak)
+
+        with _LOCK:
+            if self._name not in _STAGES:
+                _STAGES[self._name] = StageStats(self._name)
+            _STAGES[self._name].record(seconds, peak_memory)
+
+
+class _NoSpan:
+    """A context manager that does nothing, used while the instrumentation is off."""
+
+    def __enter__(self) -> _NoSpan:
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Do nothing."""
+
+
+_ENABLED = False
+_TRACE_MEMORY = False
+_STAGES: dict[str, StageStats] = {}
+_LOCK = threading.Lock()
+_NO_SPAN = _NoSpan()
+_THREAD_STATE = threading.local()
+
+
+def enable(trace_memory: bool = False) -> None:
+    """Turn the instrumentation on. If trace_memory is True, also record the peak memory of each stage, which starts
+    tracemalloc and makes every allocation noticeably slower.
+    """
+    global _ENABLED, _TRACE_MEMORY
+    _ENABLED = True
+    _TRACE_MEMORY = trace_memory
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """Turn the instrumentation off, keeping the measurements recorded so far."""
+    global _ENABLED, _TRACE_MEMORY
+    _ENABLED = False
+
+    if _TRACE_MEMORY and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _TRACE_MEMORY = False
+
+
+def is_enabled() -> bool:
+    """Return whether the instrumentation is on."""
+    return _ENABLED
+
+
+def reset() -> None:
+    """Discard every measurement recorded so far."""
+    with _LOCK:
+        _STAGES.clear()
+
+
+def span(name: str) -> Any:
+    """Return a context manager that measures the code it runs as a call of the stage with the given name.
+
+    >>> enable()
+    >>> with span('example'):
+    ...     total = sum(range(1000))
+    >>> snapshot()['example']['calls']
+    1
+    >>> disable()
+    >>> reset()
+    """
+    return _Span(name) if _ENABLED else _NO_SPAN
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Return a decorator that measures every call of the decorated function as a call of the stage with the given
+    name.
+    """
+    def decorator(function: Callable) -> Callable:
+        """Return the given function, measured as the stage."""
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            """Call the function, inside a span if the instrumentation is on."""
+            if not _ENABLED:
+                return function(*args, **kwargs)
+
+            with _Span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot() -> dict[str, dict[str, Any]]:
+    """Return the measurements of every stage, by name, as a dictionary that can be saved as JSON."""
+    with _LOCK:
+        return {name: _STAGES[name].to_dict() for name in sorted(_STAGES)}
+
+
+def to_json() -> str:
+    """Return the measurements of every stage as a JSON string."""
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_text() -> str:
+    """Return the measurements of every stage as a text table, with durations in milliseconds."""
+    lines = [f'{"stage":<28}{"calls":>8}{"total":>12}{"mean":>10}{"p50":>10}{"p90":>10}{"p99":>10}{"max":>10}'
+             f'{"peak MB":>10}']
+
+    for name, stats in snapshot().items():
+        peak = f'{stats["peak_memory_bytes"] / 2 ** 20:.1f}' if stats['peak_memory_bytes'] is not None else '-'
+        lines.append(f'{name:<28}{stats["calls"]:>8}{stats["total_ms"]:>12.2f}{stats["mean_ms"]:>10.3f}'
+                     f'{stats["p50_ms"]:>10.3f}{stats["p90_ms"]:>10.3f}{stats["p99_ms"]:>10.3f}'
+                     f'{stats["max_ms"]:>10.3f}{peak:>10}')
+
+    return '\n'.join(lines)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Return the given percentile of the sorted values with the nearest-rank method, or 0.0 if there are none.
+
+    Unlike StageStats.percentile, which only keeps a histogram, this is exact, for the callers that keep every value.
+
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50)
+    2.0
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 99)
+    4.0
+    """
+    if values == []:
+        return 0.0
+
+    return values[max(0, int(-(-len(values) * percent // 100)) - 1)]
+
+
+def _memory_frames() -> list[list[int]]:
+    """Return the memory measurements of the spans that are open on the current thread, from the outermost."""
+    if not hasattr(_THREAD_STATE, 'frames'):
+        _THREAD_STATE.frames = []
+
+    return _THREAD_STATE.frames
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['functools', 'json', 'threading', 'time', 'tracemalloc'],
+        'disable': ['global-statement'],
+        'max-line-length': 120
+    })
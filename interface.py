@@ -6,6 +6,11 @@ Content and Information
 This Python module contains the functions and Tkinter widgets
 that constitute the graphical user interface.
 
+The window never waits for the recommendation system: loading the datasets,
+finding recommendations and adding reviews run one at a time on a background
+thread, and their results are shown by callbacks that Tkinter runs on its own
+thread once they are done.
+
 Copyright and Usage Information
 ===============================
 
@@ -17,29 +22,77 @@ expressly prohibited.
 This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 """
 import tkinter as tk
-from tkinter.ttk import Notebook
+import tkinter.messagebox
+from concurrent.futures import Future, ThreadPoolExecutor
+from tkinter.ttk import Notebook, Progressbar
 from pathlib import Path
+from typing import Any, Callable, Optional
 import recommendation_system as rs
-import computation, file_reading
 import cProfile
 
+# The number of milliseconds between two checks of whether a background task is done
+POLL_INTERVAL = 50
 
 
-def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str) -> None:
+def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str,
+              load: Optional[Callable[[], Any]] = None) -> None:
     """Run the pop-up graphical user interface using the tkinter library
+
+    If load is given, it is called on a background thread to populate the given system, and the window opens right
+    away with a progress bar until it is done. Otherwise, the system must already be populated.
     >>> cProfile.runctx('interface(system, movie_file, rating_file)', globals=globals(), locals=locals())
     """
-    # create a recommendation system and populate it with movies and users
-
-    system = rs.RecommendationSystem()
-    system.add_movies_users(movie_file, rating_file)
+    # every task that uses the recommendation system runs on this single background thread, in submission order
+    executor = ThreadPoolExecutor(max_workers=1)
 
     # functions
+    def run_in_background(task: Callable[[], Any], on_done: Callable[[Any], None],
+                          on_error: Optional[Callable[[BaseException], None]] = None) -> None:
+        """Run the given task on the background thread, and call on_done with its result on the Tkinter thread once
+        it is done. If the task raises an error, show it in a dialog and call on_error with it instead."""
+        future = executor.submit(task)
+
+        def check(done: Future) -> None:
+            """Call on_done with the result of the task if it is done, or check again later."""
+            if not done.done():
+                window.after(POLL_INTERVAL, check, done)
+            elif done.exception() is not None:
+                tk.messagebox.showerror("Films for You", f'Something went wrong: {done.exception()}')
+                if on_error is not None:
+                    on_error(done.exception())
+            else:
+                on_done(done.result())
+
+        window.after(POLL_INTERVAL, check, future)
+
+    def show_status(frame: tk.Frame, text: str) -> None:
+        """Replace the widgets in the given frame with a message and an animated progress bar."""
+        clear_frame(frame)
+        tk.Label(frame, text=text, font=("Helevetica", 15, "bold"), fg="midnight blue").pack()
+        progress = Progressbar(frame, mode="indeterminate", length=300)
+        progress.pack()
+        progress.start()
+
+    def show_error(frame: tk.Frame, text: str, error: BaseException) -> None:
+        """Replace the widgets in the given frame, including its progress bar, with a message about the given error."""
+        for widget in frame.winfo_children():
+            if isinstance(widget, Progressbar):
+                widget.stop()
+        clear_frame(frame)
+        tk.Label(frame, text=text, font=("Helevetica", 15, "bold"), fg="firebrick").pack()
+        tk.Label(frame, text=str(error), font=("Helevetica", 12)).pack()
+
     def get_recommended_movies(lst: list, genre: str) -> None:
         """Generate and display the top 3 recommended movies for the user based on their movie history and
         preferred genre"""
-        movies = system.return_movies(lst, movie_file, rating_file)
-        results = system.apply_filters(movies, genre)
+        liked_movies = list(lst)
+        show_status(recommendation_tab, "Finding your recommendations...")
+        run_in_background(lambda: system.recommend(liked_movies, genre, movie_file, rating_file),
+                          show_recommended_movies,
+                          lambda error: show_error(recommendation_tab, "Could not find your recommendations.", error))
+
+    def show_recommended_movies(results: list) -> None:
+        """Display the given top 3 recommended movies."""
         clear_frame(recommendation_tab)
         text1 = "Here are your top 3 recommended movies:"
         tk.Label(recommendation_tab, text=text1, font=("Helevetica", 15, "bold"), fg="midnight blue").pack()
@@ -60,7 +113,7 @@ def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str
         text2 = "Step 2: Select your desired movie genre:"
         tk.Label(recommendation_tab, text=text2, font=("Helevetica", 15, "bold"), fg="midnight blue").pack()
 
-        genre_options = list(file_reading.return_genres(movie_file))
+        genre_options = system.genres()
 
         genre_value = tk.StringVar(recommendation_tab)
         genre_value.set("Select a movie genre")
@@ -75,10 +128,34 @@ def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str
     def add_review() -> None:
         """Add the name and rating of the user's reviewed movie into the recommendation system graph"""
         review = [f'{e1.get()}', float(f'{e2.get()}')]
-        system.add_reviews(review[0], review[1], movie_file, rating_file)
+
+        def task() -> tuple[str, list[str]]:
+            """Add the review and return the title of the reviewed movie and the titles suggested instead of it."""
+            # tolerate differences in case and punctuation, but review any other title as a new movie
+            matched = system.match_title(review[0])
+            suggestions = system.suggest_titles(review[0]) if matched is None else []
+            title = matched or review[0]
+            system.add_reviews(title, review[1], movie_file, rating_file)
+            return (title, suggestions)
+
+        show_status(review_tab, "Adding your review...")
+        run_in_background(task, show_review,
+                          lambda error: show_error(review_tab, "Could not add your review.", error))
+
+    def show_review(result: tuple[str, list[str]]) -> None:
+        """Thank the user for their review of the movie with the given title, and show the similar titles suggested
+        instead of it, if any."""
+        title, suggestions = result
         clear_frame(review_tab)
         tk.Label(review_tab, text="Thank you for your review!", font=("Helevetica", 15, "bold"),
                  fg="midnight blue").pack()
+        tk.Label(review_tab, text=f'Reviewed movie: {title}', font=("Helevetica", 15)).pack()
+
+        if suggestions != []:
+            tk.Label(review_tab, text=f'{title} was added as a new movie. Did you mean one of these?',
+                     font=("Helevetica", 12)).pack()
+            for suggestion in suggestions:
+                tk.Label(review_tab, text=suggestion, font=("Helevetica", 12)).pack()
 
     def clear_frame(f: tk.Frame) -> None:
         """Clear the widgets in the given frame."""
@@ -145,15 +222,35 @@ def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str
     tk.Label(scroll_frame, text=text6, font=("Helevetica", 15, "bold"), fg="midnight blue").pack()
 
     # displaying a list of 50 popular movies into checkboxes and extracting the user's top 3 choices
-    pop_movies = computation.popular_movies(movie_file, rating_file)
     top_3 = []
+    loading_frame = tk.Frame(scroll_frame)
+    loading_frame.pack()
 
-    for movie in pop_movies:
-        var = tk.IntVar()
-        box = tk.Checkbutton(scroll_frame, text=movie, variable=var, command=lambda x=movie: top_3.append(x))
-        box.pack()
+    def show_popular_movies(pop_movies: list[str]) -> None:
+        """Display the given popular movies as checkboxes once the recommendation system is loaded."""
+        loading_frame.destroy()
 
-    tk.Button(scroll_frame, text="Enter", command=lambda: [clear_frame(recommendation_tab), get_filter_frame()]).pack()
+        for movie in pop_movies:
+            var = tk.IntVar()
+            box = tk.Checkbutton(scroll_frame, text=movie, variable=var, command=lambda x=movie: top_3.append(x))
+            box.pack()
+
+        tk.Button(scroll_frame, text="Enter",
+                  command=lambda: [clear_frame(recommendation_tab), get_filter_frame()]).pack()
+
+    def load_system() -> list[str]:
+        """Populate the recommendation system if needed and return the list of popular movies."""
+        if load is not None:
+            load()
+        return system.popular_movies()
+
+    def show_load_error(error: BaseException) -> None:
+        """Replace the progress bar of the loading frame with the given error and a button to close the window."""
+        show_error(loading_frame, "Could not load the movies and reviews.", error)
+        tk.Button(loading_frame, text="Quit", command=window.destroy).pack()
+
+    show_status(loading_frame, "Loading movies and reviews...")
+    run_in_background(load_system, show_popular_movies, show_load_error)
 
     # review tab
     text7 = "Please enter the name of the movie you wish to review:"
@@ -169,12 +266,16 @@ def interface(system: rs.RecommendationSystem, movie_file: str, rating_file: str
 
     window.mainloop()
 
+    # let the reviews that were already submitted finish before returning
+    executor.shutdown(wait=True)
+
 
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['tkinter', 'tkinter.ttk', 'pathlib', 'recommendation_system', 'computation', 'file_reading'],
+        'extra-imports': ['tkinter', 'tkinter.ttk', 'tkinter.messagebox', 'concurrent.futures', 'pathlib',
+                          'recommendation_system'],
         'max-line-length': 120,
         'disable': ['E1120', 'too-many-locals', 'too-many-statements']
     })
@@ -19,9 +19,20 @@ This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 import interface
 import recommendation_system as rs
 
-# create a recommendation system and populate it with movies and users
+# create a recommendation system
 system = rs.RecommendationSystem()
-system.add_movies_users('data/movies_metadata.csv', 'data/ratings_small.csv')
 
-# call the interface function that creates an interactive user interface
-interface.interface(system, 'data/movies_metadata.csv', 'data/ratings_small.csv')
+
+def load() -> None:
+    """Populate the recommendation system with movies and users, and apply the reviews added in earlier runs and keep
+    the new ones."""
+    system.add_movies_users('data/movies_metadata.csv', 'data/ratings_small.csv', 'data/graph.snapshot')
+    system.open_review_log('data/reviews.log')
+
+
+# call the interface function that creates an interactive user interface, which loads the system in the background
+# (only when run as a script, since the worker processes that read large files in parallel import this module again)
+if __name__ == '__main__':
+    interface.interface(system, 'data/movies_metadata.csv', 'data/ratings_small.csv', load)
+
+    system.close_review_log()
@@ -0,0 +1,192 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the MinHashLSH class, an approximate way to find the
+users whose review histories overlap with a query profile without visiting
+every user. Each user's set of reviewed movies is summarized by a MinHash
+signature, and the signatures are split into bands that are stored in hash
+tables (locality-sensitive hashing), so only the users that share a band with
+the query are considered.
+
+More bands of fewer rows find more of the similar users (higher recall) but
+return more candidates to check (higher latency). The default of 16 bands of 4
+rows keeps the number of candidates small. A query of three liked movies has a
+small Jaccard similarity with any long review history, though, so wide bands
+find few of its similar users, which is why
+RecommendationSystem.build_minhash checks the index against the exact search
+before using it.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Iterable
+import numpy as np
+
+# A Mersenne prime, so that the products of the hash functions fit in 64 bits
+PRIME = (1 << 31) - 1
+
+
+class MinHashLSH:
+    """A MinHash signature of every user's reviewed movies and an LSH index of their bands.
+
+    Instance Attributes:
+        - num_perm: The number of hash functions in each signature.
+        - bands: The number of bands each signature is split into.
+        - rows: The number of signature values in each band.
+        - user_ids: The user id of each row of signatures.
+        - signatures: The MinHash signature of each user.
+
+    Representation Invariants:
+        - self.bands * self.rows == self.num_perm
+        - self.signatures.shape == (len(self.user_ids), self.num_perm)
+    """
+    num_perm: int
+    bands: int
+    rows: int
+    user_ids: np.ndarray
+    signatures: np.ndarray
+    _coefficients: np.ndarray
+    _intercepts: np.ndarray
+    _buckets: list[dict[bytes, list[int]]]
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 0) -> None:
+        """Initialize an empty index with num_perm hash functions drawn from the given seed, split into the given
+        number of bands.
+
+        Preconditions:
+            - num_perm % bands == 0
+        """
+        generator = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.user_ids = np.array([], dtype=np.int64)
+        self.signatures = np.zeros((0, num_perm), dtype=np.int64)
+        self._coefficients = generator.integers(1, PRIME, size=num_perm, dtype=np.int64)
+        self._intercepts = generator.integers(0, PRIME, size=num_perm, dtype=np.int64)
+        self._buckets = [{} for _ in range(bands)]
+
+    def build(self, user_movies: dict[int, Iterable[int]]) -> None:
+        """Compute the signature of every user in a dictionary that maps user ids to their reviewed movie ids, and index
+        their bands. The users without any reviewed movies are skipped.
+
+        The hashes of every edge are computed one hash function at a time, and the minimum of each user is taken with
+        np.minimum.reduceat, so no Python code runs per edge.
+        """
+        histories = {user_id: np.fromiter(movies, dtype=np.int64) for user_id, movies in user_movies.items()}
+        histories = {user_id: movies for user_id, movies in histories.items() if len(movies) > 0}
+        self.user_ids = np.fromiter(histories, dtype=np.int64, count=len(histories))
+        self.signatures = np.zeros((len(histories), self.num_perm), dtype=np.int64)
+
+        if histories != {}:
+            edges = np.concatenate(list(histories.values())) % PRIME
+            starts = np.zeros(len(histories), dtype=np.int64)
+            np.cumsum([len(movies) for movies in histories.values()][:-1], out=starts[1:])
+
+            for k in range(self.num_perm):
+                hashes = (self._coefficients[k] * edges + self._intercepts[k]) % PRIME
+                self.signatures[:, k] = np.minimum.reduceat(hashes, starts)
+
+        self._buckets = [{} for _ in range(self.bands)]
+        for row, signature in enumerate(self.signatures):
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, []).append(row)
+
+    def signature(self, movie_ids: Iterable[int]) -> np.ndarray:
+        """Return the MinHash signature of the given set of movie ids.
+
+        Preconditions:
+            - movie_ids is not empty
+        """
+        movies = np.fromiter(movie_ids, dtype=np.int64) % PRIME
+        hashes = (self._coefficients[:, None] * movies[None, :] + self._intercepts[:, None]) % PRIME
+
+        return hashes.min(axis=1)
+
+    def candidates(self, movie_ids: Iterable[int]) -> list[int]:
+        """Return the ids of the users who share at least one band of their signature with the signature of the given
+        set of movie ids.
+
+        Only the buckets of the query's bands are visited, so the cost depends on the number of candidates found
+        rather than on the total number of users.
+        """
+        rows = set()
+        for band, key in enumerate(self._band_keys(self.signature(movie_ids))):
+            rows.update(self._buckets[band].get(key, []))
+
+        return self.user_ids[sorted(rows)].tolist()
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        """Return the hash table key of each band of the given signature."""
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+
+def agreement(exact: dict[int, int], approximate: dict[int, int]) -> dict[str, float]:
+    """Return how well the similar users found by the approximate engine agree with the exact ones, given two
+    dictionaries that map user ids to their points, like RecommendationSystem.return_similar_users.
+
+    The result maps 'recall' to the fraction of the exact users that are also found approximately, 'weighted_recall'
+    to the same fraction weighted by the users' points, and 'top_recall' to the recall of the users who have the most
+    points.
+    """
+    if exact == {}:
+        return {'recall': 1.0, 'weighted_recall': 1.0, 'top_recall': 1.0}
+
+    found = [user_id for user_id in exact if user_id in approximate]
+    top_point = max(exact.values())
+    top_users = [user_id for user_id in exact if exact[user_id] == top_point]
+
+    return {
+        'recall': len(found) / len(exact),
+        'weighted_recall': sum(exact[user_id] for user_id in found) / sum(exact.values()),
+        'top_recall': len([user_id for user_id in top_users if user_id in approximate]) / len(top_users)
+    }
+
+
+def compare_with_exact(system: Any, queries: list[list[str]], movie_file: str, rating_file: str) -> dict[str, float]:
+    """Run each query of three liked movie titles through both the exact and the approximate similar user search of
+    the given RecommendationSystem, and return their average agreement (see agreement) and average latency in
+    milliseconds.
+
+    Preconditions:
+        - the approximate engine of the system has been built with build_minhash, and not discarded
+    """
+    totals = {'recall': 0.0, 'weighted_recall': 0.0, 'top_recall': 0.0, 'exact_ms': 0.0, 'approximate_ms': 0.0}
+
+    for liked_movies in queries:
+        start = time.perf_counter()
+        exact = system.return_similar_users(liked_movies, movie_file, rating_file)
+        middle = time.perf_counter()
+        approximate = system.return_similar_users(liked_movies, movie_file, rating_file, approximate=True)
+        end = time.perf_counter()
+
+        for key, value in agreement(exact, approximate).items():
+            totals[key] += value
+        totals['exact_ms'] += (middle - start) * 1000
+        totals['approximate_ms'] += (end - middle) * 1000
+
+    return {key: value / max(len(queries), 1) for key, value in totals.items()}
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['time', 'numpy'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,192 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module reads the movie file and the rating file in parallel, across a
+pool of worker processes, for the rating files that are large enough for the
+parsing to dominate the startup of the recommendation system.
+
+The rating file is split into byte ranges that end at line boundaries, and
+each worker parses one range with the same filters as
+file_reading.rating_chunks while another worker parses the movie file. Each
+worker copies its user ids and movie ids into a block of shared memory as one
+array of 32-bit integers, so only the name of the block is sent back instead of
+the pickled rows, and the ranges are returned in the order of the file, so the
+indexes built from them are the same as when the file is read sequentially.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import concurrent.futures
+import io
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+import pandas as pd
+import file_reading
+import instrumentation
+
+# The size in bytes of the smallest rating file that is read in parallel when the number of workers is not given,
+# since starting the worker processes costs more than parsing a smaller file
+PARALLEL_MIN_BYTES = 32 * 2 ** 20
+
+
+def workers_for(rating_file: str, workers: Optional[int] = None) -> int:
+    """Return the number of worker processes to read the given rating file with, which is the given number of
+    workers, or if it is None, every processor for a file of at least PARALLEL_MIN_BYTES and 1 for a smaller file.
+    """
+    if workers is not None:
+        return max(1, workers)
+    elif os.path.getsize(rating_file) < PARALLEL_MIN_BYTES:
+        return 1
+    else:
+        return os.cpu_count() or 1
+
+
+def rating_ranges(rating_file: str, num_ranges: int) -> list[tuple[int, int]]:
+    """Return at most num_ranges byte ranges (start, end) of about the same size that cover every line of the given
+    rating file after its header, each starting at the beginning of a line.
+
+    The ratings do not contain quoted values, so every newline ends a rating.
+
+    Preconditions:
+        - num_ranges >= 1
+    """
+    size = os.path.getsize(rating_file)
+    ranges = []
+
+    with open(rating_file, 'rb') as file:
+        file.readline()
+        start = file.tell()
+
+        for i in range(1, num_ranges + 1):
+            if i == num_ranges:
+                end = size
+            else:
+                file.seek(max(start, size * i // num_ranges))
+                file.readline()
+                end = file.tell()
+
+            if end > start:
+                ranges.append((start, end))
+                start = end
+
+    return ranges
+
+
+def read_files(movie_file: str, rating_file: str, workers: int) -> tuple[list, list[tuple[np.ndarray, np.ndarray]]]:
+    """Return the movies returned by file_reading.movie_file_reading and the chunks of ratings yielded by
+    file_reading.rating_chunks for the given files, in the order of the files, parsed by the given number of worker
+    processes.
+
+    The chunks can be passed to file_reading.combine_chunks or file_reading.index_chunks to build the indexes of the
+    files.
+
+    Preconditions:
+        - workers >= 1
+    """
+    with open(rating_file, 'rb') as file:
+        columns = file.readline().decode('utf-8').strip().split(',')
+
+    with instrumentation.span('parse_files'), \
+            concurrent.futures.ProcessPoolExecutor(workers, mp_context=_context()) as executor:
+        movies = executor.submit(_read_movies, movie_file)
+        ranges = [executor.submit(_read_ratings, rating_file, columns, start, end)
+                  for start, end in rating_ranges(rating_file, workers)]
+
+        return (movies.result(), [_attach(future.result()) for future in ranges])
+
+
+def _context() -> multiprocessing.context.BaseContext:
+    """Return the context to start the worker processes with.
+
+    The files can be loaded on a background thread, such as by the interface, and forking a process that runs several
+    threads is unsafe, so the workers are forked from a server process that has already imported file_reading instead,
+    where that is available.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['file_reading'])
+
+    return context
+
+
+def _read_movies(movie_file: str) -> list:
+    """Return the movies of the given movie file, like file_reading.movie_file_reading."""
+    return [movie for chunk in file_reading.movie_chunks(movie_file) for movie in chunk]
+
+
+def _read_ratings(rating_file: str, columns: list[str], start: int, end: int) -> tuple[str, int]:
+    """Parse the ratings between the given byte offsets of the given rating file, whose header has the given column
+    names, and return the name of a block of shared memory that holds their user ids followed by their (negated)
+    movie ids as 32-bit integers, and the number of ratings.
+
+    The ratings are filtered like in file_reading.rating_chunks. The block is left for the caller to unlink.
+    """
+    with open(rating_file, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    if data.strip() == b'':
+        df = pd.DataFrame({'userId': [], 'movieId': []})
+    else:
+        df = pd.read_csv(io.BytesIO(data), header=None, names=columns, usecols=['userId', 'movieId', 'rating'],
+                         dtype={'rating': np.float32})
+        df = df.dropna()
+        df = df[df['rating'] >= 3.0]
+
+    del data
+    count = len(df)
+    block = shared_memory.SharedMemory(create=True, size=max(1, 2 * count * np.dtype(np.int32).itemsize))
+    ids = np.ndarray((2, count), dtype=np.int32, buffer=block.buf)
+    ids[0] = df['userId'].to_numpy(np.int32)
+    ids[1] = -1 * df['movieId'].to_numpy(np.int32)
+
+    del ids
+    block.close()
+
+    return (block.name, count)
+
+
+def _attach(result: tuple[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the user ids and movie ids in the block of shared memory with the given name and number of ratings
+    returned by _read_ratings, copied out of the block, and unlink the block.
+    """
+    name, count = result
+    block = shared_memory.SharedMemory(name=name)
+
+    try:
+        ids = np.ndarray((2, count), dtype=np.int32, buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+
+    return (ids[0], ids[1])
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['concurrent.futures', 'file_reading', 'instrumentation', 'io', 'multiprocessing',
+                          'multiprocessing.shared_memory', 'numpy', 'os', 'pandas'],
+        'allowed-io': ['rating_ranges', 'read_files', '_read_ratings'],
+        'max-line-length': 120
+    })
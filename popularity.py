@@ -0,0 +1,135 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the PopularityIndex class, which keeps the most popular
+movies of the recommendation system up to date as reviews are added, so that
+the list of popular movies shown to the user never has to be computed again
+from the files.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import bisect
+from typing import Optional
+
+
+class PopularityIndex:
+    """The titles of the movies with at least min_votes user ratings, in decreasing order of average rating.
+
+    The popularity of a movie is defined as its average rating, like in computation.popular_movies, and movies with
+    the same average rating are ordered by when they were first added, like the stable sort of the movie file. The
+    titles are kept in a list of (-avg_rating, order, title) entries in increasing order, which is only sorted the
+    first time it is queried, so adding every movie at load time costs a single sort. After that, a movie whose rating
+    or number of ratings changes is moved within the list in O(log n) comparisons, and the top titles are read from
+    the front of the list.
+
+    >>> index = PopularityIndex(min_votes=2, size=2)
+    >>> index.update(-1, 'Heat', 7.5, 3)
+    >>> index.update(-2, 'Casino', 8.0, 1)
+    >>> index.update(-3, 'Jumanji', 6.0, 2)
+    >>> index.top()
+    ['Heat', 'Jumanji']
+    >>> index.update(-2, 'Casino', 8.0, 2)
+    >>> index.top()
+    ['Casino', 'Heat']
+
+    Instance Attributes:
+        - min_votes: The number of user ratings a movie needs to be popular.
+        - size: The number of titles returned by top by default.
+
+    Representation Invariants:
+        - self.min_votes >= 0
+        - self.size >= 0
+        - all(entry in self._entries for entry in self._movies.values())
+        - len(self._entries) == len(self._movies)
+    """
+    min_votes: int
+    size: int
+    # The entries of the movies with at least min_votes ratings, sorted unless self._sorted is False
+    _entries: list[tuple[float, int, str]]
+    # Maps the id of each movie in self._entries to its entry
+    _movies: dict[int, tuple[float, int, str]]
+    # Maps the id of every movie ever added to the order it was first added in
+    _order: dict[int, int]
+    _sorted: bool
+
+    def __init__(self, min_votes: int = 30, size: int = 50) -> None:
+        """Initialize an empty index of the movies with at least min_votes user ratings, whose top returns size titles
+        by default.
+        """
+        self.min_votes = min_votes
+        self.size = size
+        self._entries = []
+        self._movies = {}
+        self._order = {}
+        self._sorted = True
+
+    def update(self, movie_id: int, title: str, avg_rating: float, num_users: int) -> None:
+        """Record the given title, average rating and number of user ratings of the movie with the given id, adding it
+        to the popular movies if it has at least min_votes ratings.
+        """
+        self.remove(movie_id)
+
+        if num_users < self.min_votes:
+            return
+
+        entry = (-avg_rating, self._order.setdefault(movie_id, len(self._order)), title)
+        self._movies[movie_id] = entry
+
+        if self._sorted:
+            bisect.insort(self._entries, entry)
+        else:
+            self._entries.append(entry)
+
+    def remove(self, movie_id: int) -> None:
+        """Remove the movie with the given id from the popular movies, if it is one of them."""
+        entry = self._movies.pop(movie_id, None)
+
+        if entry is None:
+            return
+        elif self._sorted:
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+        else:
+            self._entries.remove(entry)
+
+    def top(self, n: Optional[int] = None) -> list[str]:
+        """Return the titles of the n most popular movies (size by default), from the most to the least popular.
+
+        Fewer than n titles are returned if fewer than n movies have at least min_votes ratings.
+        """
+        if not self._sorted:
+            self._entries.sort()
+            self._sorted = True
+
+        return [entry[2] for entry in self._entries[:self.size if n is None else n]]
+
+    def defer_sorting(self) -> None:
+        """Stop keeping the entries sorted until the next query, so that many movies can be added at once."""
+        self._sorted = False
+
+    def __len__(self) -> int:
+        """Return the number of movies with at least min_votes ratings."""
+        return len(self._entries)
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['bisect'],
+        'max-line-length': 120
+    })
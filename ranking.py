@@ -0,0 +1,147 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the RankedIndex class, which keeps the movies in
+decreasing order of average rating, both overall and for each genre, so that
+the best rated movies of a genre can be found without sorting every candidate.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import bisect
+from typing import Callable, Optional
+
+
+class RankedIndex:
+    """Movie ids in decreasing order of average rating, overall and for each genre.
+
+    Each list stores (-avg_rating, movie_id) pairs in increasing order. The lists are only sorted the first time they
+    are queried, so adding every movie at load time costs a single sort. After that, a movie whose rating changes is
+    moved within each of its lists in O(log n) comparisons.
+
+    Representation Invariants:
+        - all(movie_id in self._entries for entries in self._lists.values() for _, movie_id in entries)
+    """
+    # Maps None to the list of all movies and each genre to the list of its movies
+    _lists: dict[Optional[str], list[tuple[float, int]]]
+    # Maps each movie id to its average rating and genres
+    _entries: dict[int, tuple[float, list[str]]]
+    _sorted: bool
+
+    def __init__(self) -> None:
+        """Initialize an empty index."""
+        self._lists = {None: []}
+        self._entries = {}
+        self._sorted = True
+
+    def add(self, movie_id: int, avg_rating: float, genres: Optional[list[str]]) -> None:
+        """Add the movie with the given id, average rating and genres to this index, replacing its previous rating and
+        genres if it is already in the index.
+        """
+        if movie_id in self._entries:
+            self.remove(movie_id)
+
+        genres = list(genres or [])
+        self._entries[movie_id] = (avg_rating, genres)
+        entry = (-avg_rating, movie_id)
+
+        for key in [None] + genres:
+            entries = self._lists.setdefault(key, [])
+            if self._sorted:
+                bisect.insort(entries, entry)
+            else:
+                entries.append(entry)
+
+    def remove(self, movie_id: int) -> None:
+        """Remove the movie with the given id from this index.
+
+        Preconditions:
+            - movie_id in self._entries
+        """
+        avg_rating, genres = self._entries.pop(movie_id)
+        entry = (-avg_rating, movie_id)
+
+        for key in [None] + genres:
+            entries = self._lists[key]
+            if self._sorted:
+                del entries[bisect.bisect_left(entries, entry)]
+            else:
+                entries.remove(entry)
+
+    def top(self, genre: Optional[str], k: int, accept: Callable[[int], bool] = lambda movie_id: True,
+            limit: Optional[int] = None) -> Optional[list[int]]:
+        """Return the ids of the k movies with the highest average ratings in the given genre (or among all movies if
+        genre is None) for which accept returns True, from the highest to the lowest.
+
+        Fewer than k ids are returned if the genre does not have k accepted movies. If limit is given and more than
+        limit movies have to be visited to find k accepted ones, give up and return None instead.
+        """
+        self._sort()
+
+        result = []
+        for visited, (_, movie_id) in enumerate(self._lists.get(genre, [])):
+            if len(result) == k:
+                break
+            elif limit is not None and visited >= limit:
+                return None
+            elif accept(movie_id):
+                result.append(movie_id)
+
+        return result
+
+    def rank(self, genre: Optional[str], movie_id: int) -> int:
+        """Return the number of movies ranked above the movie with the given id in the given genre (or among all
+        movies if genre is None), in O(log n) comparisons.
+
+        >>> index = RankedIndex()
+        >>> index.add(-1, 7.0, ['Drama'])
+        >>> index.add(-2, 8.0, ['Drama', 'Crime'])
+        >>> index.add(-3, 6.0, ['Crime'])
+        >>> index.rank('Drama', -1), index.rank(None, -3)
+        (1, 2)
+
+        Preconditions:
+            - movie_id in self._entries
+            - genre is None or genre in self._entries[movie_id][1]
+        """
+        self._sort()
+
+        return bisect.bisect_left(self._lists[genre], (-self._entries[movie_id][0], movie_id))
+
+    def genres(self) -> set[str]:
+        """Return the set of genres of the movies in this index."""
+        return {genre for genre in self._lists if genre is not None and self._lists[genre] != []}
+
+    def defer_sorting(self) -> None:
+        """Stop keeping the lists sorted until the next query, so that many movies can be added at once."""
+        self._sorted = False
+
+    def _sort(self) -> None:
+        """Sort the lists if they were not kept sorted since defer_sorting was called."""
+        if not self._sorted:
+            for entries in self._lists.values():
+                entries.sort()
+            self._sorted = True
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['bisect'],
+        'max-line-length': 120
+    })
@@ -17,8 +17,12 @@ expressly prohibited.
 This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 """
 from __future__ import annotations
-from typing import Union, Any
-import computation, file_reading
+import heapq
+import random
+from collections import Counter
+from typing import Union, Any, Optional
+import als, cold_start, cooccurrence, csr_graph, dataset, genre_index, instrumentation, minhash, popularity, ranking, \
+    result_cache, review_log, snapshot, title_index
 
 
 # @check_contracts
@@ -26,32 +30,249 @@ class RecommendationSystem:
     """A movie recommendation system that contains movie and user vertices who are connected to each other based on
     review history.
 
+    The edges are either stored in the User and Movie vertices themselves, or, with the 'csr' backend, in a CSRGraph
+    whose adjacency arrays take far less memory for the full dataset. With the 'csr' backend, the Movie vertices keep
+    their information but have no linked users, and there are no User vertices.
+
+    The recommended movies are either chosen by the points of similar past users (the 'points' engine), by the
+    latent factors of a matrix factorization of the graph (the 'als' engine, see als.py), or by the precomputed top
+    co-occurring movies of each liked movie (the 'cooccurrence' engine, see cooccurrence.py).
+
+    The most popular movies are kept up to date as reviews are added (see popularity.py).
+
+    The results of return_movies and recommend are cached by their set of liked movies and genre, and discarded when a
+    review changes one of the movies they depend on (see result_cache.py).
+
     Representation Invariants:
         - all([id == self._vertices[id].user_id for id in self._vertices if isinstance(self, User)])
         - all([id == self._vertices[id].movie_id for id in self._vertices if isinstance(self, Movie)])
     """
     _vertices: dict[int, Union[User, Movie]]
+    _dataset: Optional[dataset.Dataset]
+    _graph: Optional[csr_graph.CSRGraph]
+    _cooccurrence: Optional[cooccurrence.CooccurrenceIndex]
+    _minhash: Optional[minhash.MinHashLSH]
+    _engine: str
+    _model_file: Optional[str]
+    _als: Optional[als.ALSModel]
+    _ranking: ranking.RankedIndex
+    _popularity: popularity.PopularityIndex
+    _fallback: Optional[cold_start.FallbackSampler]
+    _fallback_weighted: bool
+    _fallback_seed: int
+    _genres: genre_index.GenreIndex
+    _titles: title_index.TitleIndex
+    _cache: result_cache.ResultCache
+    _review_log: Optional[review_log.ReviewLog]
+    _next_user_id: int
+    _next_movie_id: int
+
+    def __init__(self, backend: str = 'vertices', engine: str = 'points', model_file: Optional[str] = None,
+                 cache_size: int = 256, cache_ttl: Optional[float] = None, popular_min_votes: int = 30,
+                 popular_size: int = 50, fallback_weighted: bool = False, fallback_seed: int = 0) -> None:
+        """Initialize an empty recommendation system (no vertices or edges) that stores its edges with the given
+        backend and recommends movies with the given engine.
+
+        With the 'als' engine, the model is trained when the movies and users are added, and saved into model_file if
+        it is given, so that it is loaded instead of trained the next time. With the 'cooccurrence' engine, the
+        co-occurrence index is built and saved into model_file in the same way.
+
+        At most cache_size results are cached, for at most cache_ttl seconds each if it is given. A cache_size of 0
+        disables the cache.
+
+        The popular movies are the popular_size movies with the highest average ratings among those with at least
+        popular_min_votes user ratings.
+
+        The recommendations of a query whose similar users reviewed too few movies are topped up with movies sampled
+        with the given seed, uniformly, or in proportion to their number of ratings if fallback_weighted is True.
 
-    def __init__(self) -> None:
-        """Initialize an empty recommendation system (no vertices or edges)."""
+        Preconditions:
+            - backend in {'vertices', 'csr'}
+            - engine in {'points', 'als', 'cooccurrence'}
+        """
         self._vertices = {}
+        self._dataset = None
+        self._graph = csr_graph.CSRGraph() if backend == 'csr' else None
+        self._cooccurrence = None
+        self._minhash = None
+        self._engine = engine
+        self._model_file = model_file
+        self._als = None
+        self._ranking = ranking.RankedIndex()
+        self._popularity = popularity.PopularityIndex(popular_min_votes, popular_size)
+        self._fallback = None
+        self._fallback_weighted = fallback_weighted
+        self._fallback_seed = fallback_seed
+        self._genres = genre_index.GenreIndex()
+        self._titles = title_index.TitleIndex()
+        self._cache = result_cache.ResultCache(cache_size, cache_ttl)
+        self._review_log = None
+        self._next_user_id = 1
+        self._next_movie_id = -1
+
+    def dataset(self, movie_file: str, rating_file: str) -> dataset.Dataset:
+        """Return the dataset held by this recommendation system for the given files.
+
+        The files are only parsed the first time they are asked for. If different files are given, the system switches
+        to the dataset of those files instead.
+        """
+        if self._dataset is None or not self._dataset.is_for(movie_file, rating_file):
+            self._dataset = dataset.load(movie_file, rating_file)
+
+        return self._dataset
+
+    def invalidate_dataset(self) -> None:
+        """Discard the parsed contents of the files held by this recommendation system, so that they are read again the
+        next time they are needed.
+
+        This must be called whenever the source files change on disk.
+        """
+        if self._dataset is not None:
+            self._dataset.invalidate()
 
-    def add_movies_users(self, movie_file: str, rating_file: str) -> None:
+    @instrumentation.timed('add_movies_users')
+    def add_movies_users(self, movie_file: str, rating_file: str, snapshot_file: Optional[str] = None) -> None:
         """Add movies and users as vertices into the recommendation system and add an edge between each user and each of
         their rated movie.
 
-        The information about movies and users is based on the existing datasets.
+        The information about movies and users is based on the existing datasets. If a snapshot file is given, the
+        datasets are loaded from it instead of being parsed, unless the snapshot is missing or the datasets have changed
+        since it was saved, in which case the datasets are parsed and the snapshot is saved again.
         """
-        file = file_reading.combined_files(movie_file, rating_file)
+        data = self.dataset(movie_file, rating_file)
+        if snapshot_file is not None and not data.is_loaded():
+            snapshot.load_or_build(snapshot_file, data)
 
-        for movie in file:
+        self.add_dataset(data)
+
+        if self._engine == 'als':
+            self.train_als(movie_file, rating_file)
+        elif self._engine == 'cooccurrence':
+            self.build_cooccurrence(movie_file, rating_file, self._model_file)
+
+    @instrumentation.timed('build_graph')
+    def add_dataset(self, data: dataset.Dataset) -> None:
+        """Add the movies and users of the given dataset as vertices into the recommendation system, with an edge
+        between each user and each of their rated movie, and make it the dataset held by this system.
+
+        Unlike add_movies_users, the dataset does not have to be the one shared for its files, so a modified copy, such
+        as the training part of a split (see testing.split_dataset), can be added.
+
+        The ids of the users and movies added by add_reviews are allocated after the last user and movie ids of the
+        files of the dataset, so no id in the files is reused.
+        """
+        self._dataset = data
+        self._next_user_id = max(self._next_user_id, data.last_user_id() + 1)
+        self._next_movie_id = min(self._next_movie_id, data.last_movie_id() - 1)
+        self._cache.clear()
+        self._ranking.defer_sorting()
+        self._popularity.defer_sorting()
+
+        for genre in data.genres():
+            self._genres.genre_id(genre)
+
+        for movie in data.movies():
             self.add_movie_vertex(movie[0], movie[1], movie[3], movie[4], movie[2])
 
             for user_id in movie[5]:
                 self.add_user_vertex(user_id)
                 self.add_edge(user_id, movie[0])
 
-    def return_movies(self, liked_movies: list[str], movie_file: str, rating_file: str) -> set[Movie]:
+    def save_snapshot(self, snapshot_file: str) -> None:
+        """Save the datasets held by this recommendation system into a snapshot file at the given path, so that a later
+        call to add_movies_users can load them without parsing the files.
+
+        Preconditions:
+            - self._dataset is not None
+        """
+        snapshot.save(snapshot_file, self._dataset)
+
+    def train_als(self, movie_file: str, rating_file: str, factors: int = 32, iterations: int = 10) -> None:
+        """Train the matrix factorization model used by the 'als' engine on the review histories in the given files.
+
+        If this system has a model file, the model is loaded from it when it was trained from the current files.
+        Otherwise, the model is trained and saved into that file.
+        """
+        sources = {'movie_file': movie_file, 'rating_file': rating_file}
+        model = als.load(self._model_file, sources) if self._model_file is not None else None
+
+        if model is None:
+            model = als.train(self.dataset(movie_file, rating_file).user_movies(), factors, iterations)
+
+            if self._model_file is not None:
+                model.save(self._model_file, {name: snapshot.source_key(sources[name]) for name in sources})
+
+        self._als = model
+        self._cache.clear()
+
+    def build_cooccurrence(self, movie_file: str, rating_file: str, index_file: Optional[str] = None,
+                           top_n: int = 100) -> None:
+        """Precompute the top_n co-occurring movies of each movie from the review histories in the given files, which
+        are used by return_cooccurring_movies and by the 'cooccurrence' engine.
+
+        If an index file is given, the index is loaded from it when it was built from the current files. Otherwise, the
+        index is built and saved into that file.
+        """
+        sources = {'movie_file': movie_file, 'rating_file': rating_file}
+        index = cooccurrence.load(index_file, sources) if index_file is not None else None
+
+        if index is None:
+            index = cooccurrence.build(self.dataset(movie_file, rating_file).user_movies(), top_n)
+
+            if index_file is not None:
+                index.save(index_file, {name: snapshot.source_key(sources[name]) for name in sources})
+
+        self._cooccurrence = index
+        self._cache.clear()
+
+    def return_cooccurring_movies(self, liked_movies: list[str], movie_file: str, rating_file: str) -> set[Movie]:
+        """Return a set of at least 50 recommended movies like return_movies, but chosen by merging the precomputed
+        top co-occurring movies of each liked movie instead of visiting the histories of similar users.
+
+        Like in return_movies, fewer than 50 movies are topped up with movies sampled by the fallback sampler.
+
+        Preconditions:
+            - len(liked_movies) == 3
+            - self._cooccurrence is not None
+        """
+        movie_ids = [self._titles.id_of(title) for title in liked_movies]
+        recommended_movies = {movie for movie in self._cooccurrence.merged_neighbours(movie_ids)
+                              if movie in self._vertices}
+
+        return self._top_up(recommended_movies, liked_movies)
+
+    def build_minhash(self, movie_file: str, rating_file: str, num_perm: int = 64, bands: int = 16,
+                      seed: int = 0, num_checks: int = 50, min_recall: float = 0.8) -> dict[str, float]:
+        """Build the MinHash signatures and the LSH index of every user's reviewed movies in the given files, which are
+        used by return_similar_users when approximate is True, and return how it compares with the exact search (see
+        minhash.compare_with_exact).
+
+        The index is first compared with the exact search on num_checks random queries of three movies drawn with the
+        given seed. It is only used if it is faster than the exact search and finds at least min_recall of its similar
+        users; otherwise it is discarded, and approximate queries use the exact search.
+
+        More bands (with fewer rows each) find more of the similar users at the cost of checking more candidates. Users
+        added by add_reviews after the index is built are not found until it is built again.
+
+        Preconditions:
+            - num_perm % bands == 0
+        """
+        self._minhash = minhash.MinHashLSH(num_perm, bands, seed)
+        self._minhash.build(self.dataset(movie_file, rating_file).user_movies())
+
+        titles = sorted(vertex.title for vertex in self._vertices.values() if isinstance(vertex, Movie))
+        generator = random.Random(seed)
+        queries = [generator.sample(titles, 3) for _ in range(num_checks)] if len(titles) >= 3 else []
+        comparison = minhash.compare_with_exact(self, queries, movie_file, rating_file)
+
+        if comparison['approximate_ms'] >= comparison['exact_ms'] or comparison['recall'] < min_recall:
+            self._minhash = None
+
+        return comparison
+
+    @instrumentation.timed('return_movies')
+    def return_movies(self, liked_movies: list[str], movie_file: str, rating_file: str,
+                      approximate: bool = False) -> set[Movie]:
         """Return a set of at least 50 recommended movies that are chosen based on similar past users.
 
         Prioritize the movies that are connected to the users who have the highest number of points, which means they
@@ -59,63 +280,351 @@ class RecommendationSystem:
 
         If there is no movie with similar users, randomly select and return 50 movies from the existing datset.
 
+        If approximate is True, the similar users are found with the approximate engine (see return_similar_users).
+
+        With the 'als' engine, the movies with the highest predicted preference for the liked movies are returned
+        instead (see als.ALSModel.recommend), and with the 'cooccurrence' engine, the movies that co-occur most with
+        the liked movies (see return_cooccurring_movies).
+
+        The exact results are cached, so asking again for the same liked movies in any order is a single lookup.
+
         Preconditions:
             - len(liked_movies) == 3
         """
-        recommended_movies = set()
-        users_info = file_reading.user_movies(movie_file, rating_file)
+        key = (frozenset(liked_movies), None)
+        movies = None if approximate else self._cache.get(key)
+
+        if movies is None:
+            movies = self._return_movies(liked_movies, movie_file, rating_file, approximate)
+
+            if not approximate:
+                self._cache.put(key, movies, self._dependencies(liked_movies, movies))
+
+        return set(movies)
+
+    def recommend(self, liked_movies: list[str], genre: str, movie_file: str, rating_file: str) -> \
+            list[tuple[str, list[str], float]]:
+        """Return the top three recommended movies for the given liked movies and genre, in the same format as
+        apply_filters, from the cache if the same liked movies and genre were asked for before.
+
+        With the 'points' engine, the movies of the genre are found directly in the histories of the similar users
+        (see _genre_movies), instead of filtering every movie return_movies would return. With the other engines, this
+        is like calling apply_filters on the result of return_movies.
+
+        Preconditions:
+            - len(liked_movies) == 3
+            - genre in self.genres()
+        """
+        key = (frozenset(liked_movies), genre)
+        result = self._cache.get(key)
+
+        if result is None:
+            if self._engine != 'points':
+                movies = self.return_movies(liked_movies, movie_file, rating_file)
+                result = self.apply_filters(movies, genre)
+                dependencies = self._dependencies(liked_movies, movies)
+            else:
+                users = self.return_similar_users(liked_movies, movie_file, rating_file)
+                result, dependencies = self._genre_movies(users, liked_movies, genre)
+
+            self._cache.put(key, result, dependencies)
+
+        return list(result)
+
+    def cache_stats(self) -> dict[str, int]:
+        """Return the size and the hit, miss, eviction, expiration and invalidation counters of the result cache."""
+        return self._cache.stats()
+
+    def _dependencies(self, liked_movies: list[str], movies: set[Movie]) -> set:
+        """Return the movies that the recommendations for the given liked movies depend on, given the recommended
+        movies.
+
+        The recommended movies only change if a review adds an edge to one of the liked movies, and their ranking only
+        changes if a review changes the rating of one of the recommended movies. A liked title that is not in the
+        system yet is included as is, since a review may add it.
+        """
+        dependencies = {movie.movie_id for movie in movies}
+        for title in liked_movies:
+            movie_id = self._titles.id_of(title)
+            dependencies.add(title if movie_id is None else movie_id)
+
+        return dependencies
+
+    @instrumentation.timed('genre_movies')
+    def _genre_movies(self, users: dict[int, int], liked_movies: list[str], genre: str, k: int = 3,
+                      histories: Optional[dict[int, list[int]]] = None) -> tuple[list[tuple[str, list[str], float]],
+                                                                                 set]:
+        """Return the k movies of the given genre with the highest average ratings among the movies recommended by the
+        given similar users and their points, in the same format as apply_filters, and the dependencies of the result
+        for the cache.
+
+        The histories of the users are walked from the highest to the lowest points, like in _movies_of_similar_users,
+        but only the movies of the genre are kept, with a bit test each, in a heap of the k best. The walk stops as
+        soon as one of these holds:
+            - the users of the points walked so far reviewed at least 50 movies of any genre, which are the movies
+              return_movies would recommend, and k of them belong to the genre;
+            - the k best movies found are the k best movies of the whole genre (apart from the liked movies), which
+              the ranked index checks in O(log n), so no later user can recommend a better one.
+
+        Unlike filtering the result of return_movies, a genre with fewer than k movies among the first 50 is looked
+        for in the histories of the users with fewer points, and then among the best movies of the genre overall,
+        before movies of other genres are used to fill the list.
+
+        If histories is given, the reviewed movies of each user are looked up in it first, and added to it otherwise.
+        """
+        histories = {} if histories is None else histories
+        liked_ids = {self._titles.id_of(title) for title in liked_movies} - {None}
+        # the liked movies of the genre, which do not count when checking whether the best movies were found
+        liked_in_genre = {movie_id for movie_id in liked_ids if self._genres.has_genre(movie_id, genre)}
+        tiers = {}
+        for user_id, point in users.items():
+            tiers.setdefault(point, []).append(user_id)
+
+        seen = set()
+        found = set()
+        best = []
+        complete = False
+
+        for point in sorted(tiers, reverse=True):
+            for user_id in tiers[point]:
+                for movie_id in self._history(user_id, histories):
+                    if len(seen) < 50:
+                        seen.add(movie_id)
+
+                    if movie_id not in found and movie_id not in liked_ids and \
+                            self._genres.has_genre(movie_id, genre):
+                        found.add(movie_id)
+                        entry = (self._vertices[movie_id].avg_rating, -movie_id)
+                        if len(best) < k:
+                            heapq.heappush(best, entry)
+                        elif entry > best[0]:
+                            heapq.heapreplace(best, entry)
+
+                if len(best) == k and self._has_best_of_genre(genre, -best[0][1], k, liked_in_genre):
+                    complete = True
+                    break
+
+            if complete or (len(seen) >= 50 and len(best) == k):
+                break
+
+        movie_ids = [-entry[1] for entry in sorted(best, reverse=True)]
+        dependencies = found | liked_ids | {title for title in liked_movies if self._titles.id_of(title) is None}
+
+        if complete or len(movie_ids) < k:
+            # the result also depends on the movies of the genre that were not walked, through their ratings
+            dependencies.add(('genre', genre))
+
+        if len(movie_ids) < k:
+            movie_ids += self._ranking.top(genre, k - len(movie_ids),
+                                           lambda movie_id: movie_id not in liked_ids and movie_id not in movie_ids)
+        if len(movie_ids) < k:
+            dependencies.add(('genre', None))
+            movie_ids += self._ranking.top(None, k - len(movie_ids),
+                                           lambda movie_id: movie_id not in liked_ids and movie_id not in movie_ids)
+
+        movies = [self._vertices[movie_id] for movie_id in movie_ids]
+
+        return ([(movie.title, movie.genre, movie.avg_rating) for movie in movies], dependencies)
+
+    def _has_best_of_genre(self, genre: str, movie_id: int, k: int, excluded: set[int]) -> bool:
+        """Return whether the movie with the given id is the k-th best movie of the given genre, not counting the
+        excluded movies, assuming that the k - 1 movies ranked above it that are not excluded were already found.
+
+        Preconditions:
+            - self._genres.has_genre(movie_id, genre)
+        """
+        rank = self._ranking.rank(genre, movie_id)
+        excluded_above = len([other for other in excluded if self._ranking.rank(genre, other) < rank])
+
+        return rank - excluded_above == k - 1
+
+    def _return_movies(self, liked_movies: list[str], movie_file: str, rating_file: str,
+                       approximate: bool) -> set[Movie]:
+        """Return the result of return_movies without looking it up in the cache."""
+        if self._engine == 'als':
+            recommended_movies = self._als.recommend([self._titles.id_of(title) for title in liked_movies])
+
+            return {self._vertices[movie] for movie in recommended_movies if movie in self._vertices and
+                    self._vertices[movie].title not in liked_movies}
+        elif self._engine == 'cooccurrence' and not approximate:
+            return self.return_cooccurring_movies(liked_movies, movie_file, rating_file)
+
+        # Get the similar users and their points
+        users = self.return_similar_users(liked_movies, movie_file, rating_file, approximate)
+
+        return self._movies_of_similar_users(users, liked_movies)
+
+    @instrumentation.timed('recommend_batch')
+    def recommend_batch(self, queries: list[list[str]], movie_file: str, rating_file: str,
+                        genres: Optional[list[str]] = None) -> list:
+        """Return the recommendations for many queries at once, in the same order as the queries.
+
+        Each query is a list of three liked movie titles. If genres is None, the result of each query is the set of
+        movies return_movies would return for it. Otherwise, genres[i] is the preferred genre of the i-th query and its
+        result is the list recommend would return.
+
+        The work shared between queries is only done once for the whole batch: the linked users of each distinct liked
+        movie and the history of each similar user are looked up once, and with the 'als' engine every query is scored
+        by the same matrix product.
+
+        Preconditions:
+            - all(len(liked_movies) == 3 for liked_movies in queries)
+            - genres is None or len(genres) == len(queries)
+        """
+        movie_sets = []
+
+        if self._engine == 'points' and genres is not None:
+            linked_users = {}
+            histories = {}
+            results = []
 
-        # Get a set of similar users
-        users = self.return_similar_users(liked_movies, movie_file, rating_file)
+            for liked_movies, genre in zip(queries, genres):
+                results.append(self._genre_movies(self._count_points(liked_movies, linked_users), liked_movies, genre,
+                                                  histories=histories)[0])
 
-        for user in users:
-            if user.point == 3:
-                recommended_movies = recommended_movies.union(users_info[user.user_id])
+            return results
+
+        if self._engine == 'als':
+            ranked = self._als.recommend_many([[self._titles.id_of(title) for title in liked_movies]
+                                               for liked_movies in queries])
+
+            for liked_movies, recommended_movies in zip(queries, ranked):
+                movie_sets.append({self._vertices[movie] for movie in recommended_movies if movie in self._vertices
+                                   and self._vertices[movie].title not in liked_movies})
+        elif self._engine == 'cooccurrence':
+            movie_sets = [self.return_cooccurring_movies(liked_movies, movie_file, rating_file)
+                          for liked_movies in queries]
+        else:
+            linked_users = {}
+            histories = {}
+
+            for liked_movies in queries:
+                movie_sets.append(self._movies_of_similar_users(self._count_points(liked_movies, linked_users),
+                                                                liked_movies, histories))
+
+        if genres is None:
+            return movie_sets
+
+        return [self.apply_filters(movies, genre) for movies, genre in zip(movie_sets, genres)]
+
+    def _count_points(self, liked_movies: list[str], linked_users: dict[int, list[int]]) -> dict[int, int]:
+        """Return the similar users of the given liked movies and their points, like return_similar_users, with the
+        linked users of each movie looked up in linked_users first, and added to it otherwise.
+        """
+        users = Counter()
+        for movie_id in [self._titles.id_of(title) for title in liked_movies]:
+            if movie_id not in linked_users:
+                linked_users[movie_id] = self.linked_users(movie_id)
+            users.update(linked_users[movie_id])
+
+        return users
+
+    def _movies_of_similar_users(self, users: dict[int, int], liked_movies: list[str],
+                                 histories: Optional[dict[int, list[int]]] = None) -> set[Movie]:
+        """Return the set of recommended movies for return_movies, given the similar users and their points.
+
+        If the similar users have reviewed fewer than 50 movies, the set is topped up to 50 movies other than the liked
+        ones with movies sampled by the fallback sampler (see cold_start.py), with a random number generator seeded by
+        the liked movies, so the same query always gets the same movies.
+
+        If histories is given, the reviewed movies of each user are looked up in it first, and added to it otherwise,
+        so that a batch of queries reads each history only once.
+        """
+        recommended_movies = set()
+        histories = {} if histories is None else histories
+
+        for user_id in users:
+            if users[user_id] == 3:
+                recommended_movies = recommended_movies.union(self._history(user_id, histories))
 
         if len(recommended_movies) < 50:
-            for user in users:
-                if user.point == 2:
-                    recommended_movies = recommended_movies.union(users_info[user.user_id])
+            for user_id in users:
+                if users[user_id] == 2:
+                    recommended_movies = recommended_movies.union(self._history(user_id, histories))
 
         if len(recommended_movies) < 50:
-            for user in users:
-                if user.point == 1:
-                    recommended_movies = recommended_movies.union(users_info[user.user_id])
+            for user_id in users:
+                if users[user_id] == 1:
+                    recommended_movies = recommended_movies.union(self._history(user_id, histories))
+
+        return self._top_up(recommended_movies, liked_movies)
 
+    def _top_up(self, recommended_movies: set[int], liked_movies: list[str]) -> set[Movie]:
+        """Return the movies with the given ids other than the liked movies, topped up to 50 movies with movies
+        sampled by the fallback sampler (see cold_start.py) if there are fewer, with a random number generator seeded by
+        the liked movies, so the same query always gets the same movies.
+        """
         if len(recommended_movies) < 50:
-            movie_subset = computation.random_select_movies(0 - len(recommended_movies), movie_file, rating_file)
-            recommended_movies.union(movie_subset)
+            liked_ids = {self._titles.id_of(title) for title in liked_movies}
+            generator = random.Random(f'{self._fallback_seed}:' + '\n'.join(sorted(liked_movies)))
+            movie_subset = self._fallback_sampler().sample(50 - len(recommended_movies - liked_ids), generator,
+                                                           recommended_movies | liked_ids)
+            recommended_movies = recommended_movies.union(movie_subset)
 
         movies = {self._vertices[movie] for movie in recommended_movies if self._vertices[movie].title not in
                   liked_movies}
 
         return movies
 
-    def return_similar_users(self, liked_movies: list[str], movie_file: str, rating_file: str) -> set[User]:
-        """Return a set of users who have watched at least one of the movies given. In other words, if the number of
-        points the user has is greater than or equal to 1.
+    def _fallback_sampler(self) -> cold_start.FallbackSampler:
+        """Return the sampler of the movies in this system used to top up the recommendations of return_movies,
+        building it if a movie was added since it was last built.
+
+        With fallback_weighted, the movies are sampled in proportion to their number of ratings when it was built.
+        """
+        if self._fallback is None:
+            movies = [vertex for vertex in self._vertices.values() if isinstance(vertex, Movie)]
+            weights = [movie.num_users for movie in movies] if self._fallback_weighted else None
+            self._fallback = cold_start.FallbackSampler([movie.movie_id for movie in movies], weights)
+
+        return self._fallback
+
+    def _history(self, user_id: int, histories: dict[int, list[int]]) -> list[int]:
+        """Return the ids of the movies reviewed by the user with the given id, memoized in histories."""
+        if user_id not in histories:
+            histories[user_id] = self.reviewed_movies(user_id)
 
-        Increase the user's point by one for each movie given that is connected to the movie.
+        return histories[user_id]
+
+    @instrumentation.timed('return_similar_users')
+    def return_similar_users(self, liked_movies: list[str], movie_file: str, rating_file: str,
+                             approximate: bool = False) -> dict[int, int]:
+        """Return a dictionary that maps the id of each user who has watched at least one of the movies given to the
+        number of points the user has for this query.
+
+        A user gets one point for each movie given that is connected to the user. Only the users linked to the given
+        movies are visited, and the points are counted per query, so the vertices are never modified.
+
+        If approximate is True, only the candidate users found by the MinHash LSH index are considered, so some of the
+        similar users may be missed (see minhash.compare_with_exact). The exact search is used instead if there is no
+        index, or it was discarded by build_minhash.
 
         Preconditions:
             - len(liked_movies) == 3
         """
-        movie_title_id = file_reading.movie_title_id(movie_file, rating_file)
-        movie_ids = [movie_title_id[title] for title in liked_movies]
-        users_info = file_reading.user_movies(movie_file, rating_file)
-        users = set()
+        movie_ids = [self._titles.id_of(title) for title in liked_movies]
 
-        for user_id in users_info:
-            user = self._vertices[user_id]
-            for movie_id in movie_ids:
-                if movie_id in users_info[user_id]:
-                    user.point += 1
+        if approximate and self._minhash is not None:
+            users = {}
+            for user_id in self._minhash.candidates(movie_ids):
+                reviewed_movies = set(self.reviewed_movies(user_id))
+                point = len([movie_id for movie_id in movie_ids if movie_id in reviewed_movies])
+                if point >= 1:
+                    users[user_id] = point
 
-            if user.point >= 1:
-                users.add(user)
+            return users
 
-        return users
+        if self._graph is not None:
+            user_ids, points = self._graph.count_linked_users(movie_ids)
+            return dict(zip(user_ids.tolist(), points.tolist()))
+
+        users = Counter()
+        for movie_id in movie_ids:
+            users.update(self.linked_users(movie_id))
 
+        return dict(users)
+
+    @instrumentation.timed('apply_filters')
     def apply_filters(self, movie_set: set[Movie], genre: str) -> list[tuple[str, list[str], float]]:
         """Return a list of three movies, their genres, and average ratings. The returned movies belong to the
         genre given and are sorted based on their average ratings.
@@ -124,75 +633,206 @@ class RecommendationSystem:
         the highest ratings.
 
         Preconditions:
-            - genre in file_reading.return_genres()
+            - genre in self.genres()
         """
-        movie_vertex = list(movie_set)
-
-        movie_list = []
-        for movie in movie_vertex:
-            if genre in movie.genre:
-                movie_list.append(movie)
-
-        movie_list.sort(key=lambda curr_movie: curr_movie.avg_rating, reverse=True)
-        final_movie_list = [(curr_movie.title, curr_movie.genre, curr_movie.avg_rating)
-                            for curr_movie in movie_list[0:3]]
+        movie_list = self._top_movies(movie_set, genre, 3, [])
+        final_movie_list = [(curr_movie.title, curr_movie.genre, curr_movie.avg_rating) for curr_movie in movie_list]
 
         if len(final_movie_list) < 3:
-            movie_vertex.sort(key=lambda curr_movie: curr_movie.avg_rating, reverse=True)
             final_movie_list += [(curr_movie.title, curr_movie.genre, curr_movie.avg_rating) for curr_movie in
-                                 movie_vertex if curr_movie not in movie_list][0:3 - len(final_movie_list)]
+                                 self._top_movies(movie_set, None, 3 - len(final_movie_list), movie_list)]
 
         return final_movie_list
 
+    def _top_movies(self, movie_set: set[Movie], genre: Optional[str], k: int, excluded: list[Movie]) -> list[Movie]:
+        """Return the k movies with the highest average ratings in movie_set that belong to the given genre (or to any
+        genre if genre is None) and are not excluded, from the highest to the lowest.
+
+        The movies of the genre are first visited in rating order in the ranked index, giving up after as many movies as
+        there are candidates. Only then are the candidates themselves ranked, with a bounded heap of size k instead of a
+        full sort. Either way, movies with the same rating are ordered by id, so the result does not depend on the
+        iteration order of movie_set.
+        """
+        movie_ids = self._ranking.top(genre, k, lambda movie_id: self._vertices[movie_id] in movie_set and
+                                      self._vertices[movie_id] not in excluded, len(movie_set))
+
+        if movie_ids is not None:
+            return [self._vertices[movie_id] for movie_id in movie_ids]
+
+        return heapq.nlargest(k, [movie for movie in movie_set if movie not in excluded and
+                                  (genre is None or self._genres.has_genre(movie.movie_id, genre))],
+                              key=lambda curr_movie: (curr_movie.avg_rating, -curr_movie.movie_id))
+
+    def genres(self) -> list[str]:
+        """Return the names of all genres of the movies in this recommendation system and its dataset, in alphabetical
+        order, such as for the genre drop-down menu of the interface.
+
+        The returned list is shared, so it must not be mutated.
+        """
+        return self._genres.names()
+
+    def popular_movies(self, n: Optional[int] = None) -> list[str]:
+        """Return the titles of the n most popular movies in this recommendation system (popular_size by default),
+        from the most to the least popular, such as for the first step of the interface.
+
+        Unlike computation.popular_movies, the list is not computed from the files, and it includes the reviews added
+        to this system.
+        """
+        return self._popularity.top(n)
+
+    @instrumentation.timed('add_reviews')
     def add_reviews(self, title: str, rating: float, movie_file: str, rating_file: str) -> None:
-        """Add an edge between the movie vertex with given title and the user with given id.
+        """Add an edge between the movie vertex with given title and a new user.
 
         Recalculate the average rating of the movie with the new rating added. Increase the number of reviewers for the
         movie by one.
 
-        If the movie is not in the system yet, assign a new id to it and add it to the system. The new id is generated
-        based on the number follow the current last movie id (or the largest id) in the system.
+        If the movie is not in the system yet, assign a new id to it and add it to the system. The new ids of users and
+        movies are allocated in memory, following the largest user id and the smallest (negated) movie id in the system
+        and in the files it was populated from (see add_dataset), so no id is reused.
+
+        If a review log is open, the review is also appended to it, so that it is applied again after a restart.
 
         Preconditions:
             - 0.0 <= rating <= 10.0
         """
-        movie_title_id = file_reading.movie_title_id(movie_file, rating_file)
+        movie_id = self._titles.id_of(title)
+        if movie_id is None:
+            movie_id = self._next_movie_id
 
-        if title not in movie_title_id:
-            movie_file = file_reading.movie_file_reading(movie_file)
-            movie_id = movie_file[-1][0] + 1
+        user_id = self._next_user_id
+        self._apply_review(user_id, movie_id, title, rating)
+
+        if self._review_log is not None:
+            self._review_log.append({'user_id': user_id, 'movie_id': movie_id, 'title': title, 'rating': rating})
+
+    def _apply_review(self, user_id: int, movie_id: int, title: str, rating: float) -> None:
+        """Add the review of the movie with the given id and title by the user with the given id, adding the movie and
+        the user to the system if they are not in it yet.
+
+        The cached results that depend on the movie are discarded. If the user already reviewed other movies, the
+        review also adds a co-occurrence of the movie with each of them to the co-occurrence index, and the cached
+        results that depend on those movies are discarded too. A review by a new user, such as every review added by
+        add_reviews, reviews a single movie and so does not change the co-occurrences.
+        """
+        self._cache.invalidate(movie_id)
+        self._cache.invalidate(title)
+        self._cache.invalidate(('genre', None))
+        for genre in self._genres.genres_of(movie_id):
+            self._cache.invalidate(('genre', genre))
+
+        if movie_id not in self._vertices:
             self.add_movie_vertex(movie_id, title, rating, 1)
 
         else:
-            movie_id = movie_title_id[title]
             total_score = self._vertices[movie_id].avg_rating * self._vertices[movie_id].num_users + rating
             self._vertices[movie_id].num_users += 1
             self._vertices[movie_id].avg_rating = total_score / self._vertices[movie_id].num_users
 
-        rating_file = file_reading.rating_file_reading(rating_file)
-        user_id = rating_file[-1][0] + 1
-        self.add_user_vertex(user_id)
+            self._ranking.add(movie_id, self._vertices[movie_id].avg_rating, self._vertices[movie_id].genre)
+            self._popularity.update(movie_id, title, self._vertices[movie_id].avg_rating,
+                                    self._vertices[movie_id].num_users)
 
+            if self._graph is not None:
+                self._graph.add_movie_vertex(movie_id, title, self._vertices[movie_id].avg_rating,
+                                             self._vertices[movie_id].num_users, self._vertices[movie_id].genre)
+
+        self.add_user_vertex(user_id)
+        # the movies the user reviewed before this one, which now co-occur with it
+        previous_movies = [other_id for other_id in self.reviewed_movies(user_id) if other_id != movie_id]
         self.add_edge(user_id, movie_id)
 
+        if self._cooccurrence is not None and previous_movies != []:
+            self._cooccurrence.add_review(previous_movies, movie_id)
+            for other_id in previous_movies:
+                self._cache.invalidate(other_id)
+
+    def open_review_log(self, log_file: str, sync_every: int = 8) -> None:
+        """Open the review log stored in the given file, apply the reviews in it that are not already part of the
+        loaded dataset, and append every later review to it.
+
+        Reviews are forced to disk once every sync_every reviews, and when the log is closed.
+        """
+        self._review_log = review_log.ReviewLog(log_file, sync_every)
+        review_seq = self._dataset.review_seq() if self._dataset is not None else 0
+
+        for record in self._review_log.records(review_seq):
+            self._apply_review(record['user_id'], record['movie_id'], record['title'], record['rating'])
+
+    def close_review_log(self) -> None:
+        """Force the pending reviews of the review log to disk and close it."""
+        if self._review_log is not None:
+            self._review_log.close()
+            self._review_log = None
+
+    def compact_reviews(self, snapshot_file: str) -> None:
+        """Save the current movies and users, including every review in the review log, into a snapshot file at the
+        given path, and move the reviews out of the log into its archive.
+
+        The archive is only read again if the snapshot becomes stale because the source files change.
+
+        Preconditions:
+            - self._dataset is not None
+            - self._review_log is not None
+        """
+        self._review_log.sync()
+        movies = [[vertex.movie_id, vertex.title, vertex.genre or [], vertex.avg_rating, vertex.num_users,
+                   self.linked_users(vertex.movie_id)] for vertex in self._vertices.values()
+                  if isinstance(vertex, Movie)]
+
+        snapshot.save(snapshot_file, self._dataset, [movie for movie in movies if movie[5] != []],
+                      self._review_log.last_seq)
+        self._review_log.archive()
+
     def return_avg_rating(self, title: str) -> Any:
         """Return the average rating for a movie.
 
         Return None is there is no such a movie found in the system.
         """
-        for vertex in self._vertices:
-            if isinstance(self._vertices[vertex], Movie):
-                if title == self._vertices[vertex].title:
-                    return round(self._vertices[vertex].avg_rating, 2)
+        movie_id = self._titles.id_of(title)
+
+        if movie_id is None:
+            return None
+
+        return round(self._vertices[movie_id].avg_rating, 2)
+
+    def has_movie(self, title: str) -> bool:
+        """Return whether a movie with exactly the given title is in this recommendation system."""
+        return self._titles.id_of(title) is not None
+
+    def match_title(self, text: str) -> Optional[str]:
+        """Return the title of the movie in the system that the given text refers to, tolerating differences in case,
+        spacing and punctuation (see title_index.TitleIndex.match).
+
+        Return None if there is no such title. A title with a different spelling is never returned, since it may be a
+        different movie; see suggest_titles.
+        """
+        return self._titles.match(text)
 
-        return None
+    def suggest_titles(self, text: str, limit: int = 5) -> list[str]:
+        """Return up to limit titles of movies in the system that are spelled most similarly to the given text, from
+        the most to the least similar, for the user to choose from when the text matches no title.
+        """
+        return self._titles.fuzzy(text, limit)
+
+    def search_titles(self, text: str, limit: int = 10) -> list[str]:
+        """Return up to limit titles of movies in the system that start with the given text, or, if there are none,
+        the titles that are spelled most similarly to it.
+        """
+        return self._titles.prefix(text, limit) or self._titles.fuzzy(text, limit)
 
     def add_user_vertex(self, user_id: int) -> None:
         """Add a user vertex with the given user id to this recommendation system.
 
-        The new user vertex is not connected to any other movie vertices.
+        The new user vertex is not connected to any other movie vertices. Do nothing if the user is already in the
+        system, so that the user keeps their edges.
         """
-        self._vertices[user_id] = User(user_id, set())
+        self._next_user_id = max(self._next_user_id, user_id + 1)
+
+        if self._graph is not None:
+            self._graph.add_user_vertex(user_id)
+        elif user_id not in self._vertices:
+            self._vertices[user_id] = User(user_id, set())
 
     def add_movie_vertex(self, movie_id: int, title: str, avg_rating: float, num_users: int, genre: list[str] = None) \
             -> None:
@@ -200,7 +840,16 @@ class RecommendationSystem:
 
         The new movie vertex is not connected to any other user vertices.
         """
+        self._next_movie_id = min(self._next_movie_id, movie_id - 1)
         self._vertices[movie_id] = Movie(movie_id, set(), title, genre, avg_rating, num_users)
+        self._ranking.add(movie_id, avg_rating, genre)
+        self._popularity.update(movie_id, title, avg_rating, num_users)
+        self._fallback = None
+        self._genres.add(movie_id, genre)
+        self._titles.add(title, movie_id)
+
+        if self._graph is not None:
+            self._graph.add_movie_vertex(movie_id, title, avg_rating, num_users, genre)
 
     def add_edge(self, user_id: int, movie_id: int) -> None:
         """Add an edge between the two vertices with the given user and movie ids in this recommendation system.
@@ -210,7 +859,9 @@ class RecommendationSystem:
         Preconditions:
             - user_id != movie_id
         """
-        if user_id in self._vertices and movie_id in self._vertices:
+        if self._graph is not None:
+            self._graph.add_edge(user_id, movie_id)
+        elif user_id in self._vertices and movie_id in self._vertices:
             user = self._vertices[user_id]
             movie = self._vertices[movie_id]
 
@@ -219,6 +870,28 @@ class RecommendationSystem:
         else:
             raise ValueError
 
+    def reviewed_movies(self, user_id: int) -> list[int]:
+        """Return a list of the ids of the movies reviewed by the user with the given id.
+
+        Preconditions:
+            - the user with the given id is in this recommendation system
+        """
+        if self._graph is not None:
+            return self._graph.reviewed_movies(user_id).tolist()
+        else:
+            return [movie.movie_id for movie in self._vertices[user_id].reviewed_movies]
+
+    def linked_users(self, movie_id: int) -> list[int]:
+        """Return a list of the ids of the users linked to the movie with the given id.
+
+        Preconditions:
+            - movie_id in self._vertices
+        """
+        if self._graph is not None:
+            return self._graph.linked_users(movie_id).tolist()
+        else:
+            return [user.user_id for user in self._vertices[movie_id].linked_users]
+
 
 # @check_contracts
 class Vertex:
@@ -230,12 +903,11 @@ class Vertex:
 
 # @check_contracts
 class User(Vertex):
-    """A User vertex, which contains information about the movies the user rated and the number of points it has.
+    """A User vertex, which contains information about the movies the user rated.
 
     Instance Attributes:
         - user_id: The unique id that represents the user.
         - reviewed_movies: The movie vertices that are connected to this user vertex.
-        - point: The number of point the user has with a defualt value 0.
 
     Representation Invariants:
         - self not in self.reviewed_movies
@@ -243,15 +915,11 @@ class User(Vertex):
     """
     user_id: int
     reviewed_movies: set[Vertex]
-    point: int
 
-    def __init__(self, user_id: int, reviewed_movies: set[Movie], point: int = 0) -> None:
-        """Initialize a new user vertex with the user id and corresponding reviewed movies. The number of point
-        is set as 0 for default.
-        """
+    def __init__(self, user_id: int, reviewed_movies: set[Movie]) -> None:
+        """Initialize a new user vertex with the user id and corresponding reviewed movies."""
         self.user_id = user_id
         self.reviewed_movies = reviewed_movies
-        self.point = point
 
 
 # @check_contracts
@@ -296,7 +964,9 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['file_reading', 'computation'],
+        'extra-imports': ['als', 'cold_start', 'collections', 'cooccurrence', 'csr_graph', 'dataset', 'genre_index',
+                          'heapq', 'instrumentation', 'minhash', 'popularity', 'random', 'ranking', 'result_cache',
+                          'review_log', 'snapshot', 'title_index'],
         'disable': ['unused-import', 'too-many-arguments'],
         'max-line-length': 120
     })
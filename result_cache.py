@@ -0,0 +1,175 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the ResultCache class, a bounded cache of recent
+recommendation results, so that the queries that come up again and again in
+the interface are not computed from scratch every time.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+class ResultCache:
+    """A least recently used cache of results, each of which depends on a set of movies.
+
+    When the cache is full, the least recently used result is evicted. A result older than ttl seconds is discarded
+    the next time it is looked up. A result can be invalidated through any of the movies it depends on, so a change to
+    one movie only discards the results that could have changed.
+
+    The cache can be used by several threads at once.
+
+    >>> cache = ResultCache(max_size=2)
+    >>> cache.put('a', 1, [-1, -2])
+    >>> cache.put('b', 2, [-2])
+    >>> cache.get('a')
+    1
+    >>> cache.put('c', 3, [-3])
+    >>> cache.get('b') is None
+    True
+    >>> cache.invalidate(-1)
+    >>> cache.get('a') is None
+    True
+    >>> cache.stats()
+    {'size': 1, 'hits': 1, 'misses': 2, 'evictions': 1, 'expirations': 0, 'invalidations': 1}
+
+    Instance Attributes:
+        - max_size: The maximum number of results kept at once.
+        - ttl: The number of seconds a result is kept for, or None if results do not expire.
+        - hits: The number of lookups that found a result.
+        - misses: The number of lookups that did not find a result.
+        - evictions: The number of results discarded because the cache was full.
+        - expirations: The number of results discarded because they were older than ttl.
+        - invalidations: The number of results discarded because a movie they depend on changed.
+
+    Representation Invariants:
+        - self.max_size >= 0
+        - len(self._entries) <= self.max_size
+        - all(key in self._dependents[dependency] for key in self._entries for dependency in self._entries[key][2])
+    """
+    max_size: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    # Maps each key to its result, the time it expires at and the movies it depends on, from least to most recently used
+    _entries: OrderedDict[Hashable, tuple[Any, float, frozenset]]
+    # Maps each movie to the keys of the results that depend on it
+    _dependents: dict[Hashable, set[Hashable]]
+    _clock: Callable[[], float]
+    _lock: threading.Lock
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """Initialize an empty cache that keeps at most max_size results for at most ttl seconds each, as measured by
+        the given clock.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._dependents = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the result cached for the given key and mark it as the most recently used, or None if there is no
+        such result or it has expired.
+        """
+        with self._lock:
+            if key in self._entries and self._entries[key][1] <= self._clock():
+                self._discard(key)
+                self.expirations += 1
+
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any, depends_on: Iterable[Hashable]) -> None:
+        """Cache the given result for the given key, as depending on the given movies, evicting the least recently used
+        result if the cache is full.
+
+        Preconditions:
+            - value is not None
+        """
+        if self.max_size == 0:
+            return
+
+        with self._lock:
+            self._discard(key)
+
+            while len(self._entries) >= self.max_size:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+            dependencies = frozenset(depends_on)
+            expires = self._clock() + self.ttl if self.ttl is not None else float('inf')
+            self._entries[key] = (value, expires, dependencies)
+
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+
+    def invalidate(self, dependency: Hashable) -> None:
+        """Discard every result that depends on the given movie."""
+        with self._lock:
+            for key in self._dependents.pop(dependency, set()):
+                self._discard(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Discard every result, without changing the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of cached results and the counters of this cache."""
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'invalidations': self.invalidations}
+
+    def _discard(self, key: Hashable) -> None:
+        """Remove the result cached for the given key, if there is one."""
+        if key in self._entries:
+            for dependency in self._entries.pop(key)[2]:
+                if dependency in self._dependents:
+                    self._dependents[dependency].discard(key)
+                    if self._dependents[dependency] == set():
+                        del self._dependents[dependency]
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['threading', 'time', 'collections'],
+        'max-line-length': 120
+    })
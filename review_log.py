@@ -0,0 +1,138 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the ReviewLog class, a durable append-only log of the
+reviews added through the interface, so that they are kept across restarts.
+
+Each review is written as one JSON line with an increasing sequence number.
+The lines are buffered and only forced to disk (fsync) once every few reviews,
+or when the log is flushed or closed. When the log is compacted into a
+snapshot, its lines are moved to an archive file next to it, and the snapshot
+records the last sequence number it contains, so no review is applied twice.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import json
+import os
+from typing import Any, Iterator, Optional, TextIO
+
+
+class ReviewLog:
+    """An append-only log of reviews stored in a file.
+
+    Instance Attributes:
+        - log_file: The path of the file the reviews are appended to.
+        - archive_file: The path of the file the compacted reviews are moved to.
+        - sync_every: The number of reviews that are buffered before they are forced to disk.
+        - last_seq: The sequence number of the last review in the log or its archive.
+
+    Representation Invariants:
+        - self.sync_every >= 1
+        - self.last_seq >= 0
+    """
+    log_file: str
+    archive_file: str
+    sync_every: int
+    last_seq: int
+    _file: Optional[TextIO]
+    _pending: int
+
+    def __init__(self, log_file: str, sync_every: int = 8) -> None:
+        """Open the log stored in the given file for appending, creating it if it does not exist yet."""
+        self.log_file = log_file
+        self.archive_file = log_file + '.archive'
+        self.sync_every = sync_every
+        self.last_seq = max([record['seq'] for record in self.records()], default=0)
+        self._file = open(log_file, 'a', encoding='utf-8')
+        self._pending = 0
+
+        # end a partially written last line, so that the next review starts on a line of its own
+        if self._file.tell() > 0:
+            with open(log_file, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def records(self, after_seq: int = 0) -> Iterator[dict[str, Any]]:
+        """Yield the reviews in the archive and then in the log, in the order they were appended, skipping the ones
+        with a sequence number less than or equal to after_seq.
+
+        A last line that was only partially written, for example because of a crash, is ignored.
+        """
+        for path in (self.archive_file, self.log_file):
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as file:
+                    for line in file:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if record['seq'] > after_seq:
+                            yield record
+
+    def append(self, record: dict[str, Any]) -> int:
+        """Append the given review to the log and return its sequence number.
+
+        The review is written to the operating system right away, but only forced to disk once sync_every reviews are
+        pending.
+        """
+        self.last_seq += 1
+        self._file.write(json.dumps({'seq': self.last_seq, **record}) + '\n')
+        self._file.flush()
+        self._pending += 1
+
+        if self._pending >= self.sync_every:
+            self.sync()
+
+        return self.last_seq
+
+    def sync(self) -> None:
+        """Force the pending reviews to disk."""
+        if self._pending > 0:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def archive(self) -> None:
+        """Move the reviews in the log to the archive file, after they have been compacted into a snapshot."""
+        self.sync()
+        self._file.close()
+
+        with open(self.log_file, encoding='utf-8') as source, open(self.archive_file, 'a', encoding='utf-8') as target:
+            target.write(source.read())
+            target.flush()
+            os.fsync(target.fileno())
+
+        self._file = open(self.log_file, 'w', encoding='utf-8')
+
+    def close(self) -> None:
+        """Force the pending reviews to disk and close the log."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os'],
+        'allowed-io': ['__init__', 'records', 'archive'],
+        'max-line-length': 120
+    })
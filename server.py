@@ -0,0 +1,386 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This Python module runs the movie recommendation system as a headless HTTP
+service that answers JSON requests, so that other processes can get
+recommendations without the graphical user interface. For example:
+
+    python server.py --port 8080
+    curl -d '{"liked": ["Toy Story", "Heat", "Casino"], "genre": "Drama"}' localhost:8080/recommend
+
+The endpoints are:
+    - GET /popular: the 50 most popular movies
+    - GET /genres: every genre, for the genre filter
+    - GET /rating?title=...: the average rating of a movie
+    - POST /recommend: the top three movies for {"liked": [three titles], "genre": genre}
+    - POST /reviews: add a review of {"title": title, "rating": rating out of 10.0}
+    - GET /stats: the number of requests, latency percentiles and throughput of each endpoint, and the
+      measurements of each stage of the system if it is run with --instrument (see instrumentation)
+
+The service only uses asyncio and the standard library. Every connection is
+served concurrently and kept alive between requests. The recommendation system
+is not thread-safe and its scoring is CPU-bound, so the requests that use it are
+run one at a time on a single background thread, which keeps the event loop
+free to accept and parse other requests meanwhile.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+import instrumentation
+import recommendation_system as rs
+
+# The largest request head and body that are accepted, in bytes
+MAX_HEAD_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+
+# The number of most recent latencies of each endpoint that the percentiles are computed from
+LATENCY_WINDOW = 10_000
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """An error that is answered with the given HTTP status and message.
+
+    Instance Attributes:
+        - status: The HTTP status code of the response.
+        - message: The error message sent in the JSON body of the response.
+    """
+    status: int
+    message: str
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize an error with the given status and message."""
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RecommendationService:
+    """A JSON service over a single shared recommendation system.
+
+    Instance Attributes:
+        - system: The recommendation system that answers the requests.
+        - movie_file: The path of the movie file the system was populated from.
+        - rating_file: The path of the rating file the system was populated from.
+        - started: The time the service started at, from time.monotonic.
+
+    Representation Invariants:
+        - all(self._counts[route] >= len(self._latencies[route]) for route in self._counts)
+    """
+    system: rs.RecommendationSystem
+    movie_file: str
+    rating_file: str
+    started: float
+    _executor: ThreadPoolExecutor
+    # Maps each endpoint to the number of requests it answered and their most recent latencies in seconds
+    _counts: dict[str, int]
+    _errors: dict[str, int]
+    _latencies: dict[str, deque[float]]
+
+    def __init__(self, system: rs.RecommendationSystem, movie_file: str, rating_file: str) -> None:
+        """Initialize a service over the given recommendation system, which was populated from the given files."""
+        self.system = system
+        self.movie_file = movie_file
+        self.rating_file = rating_file
+        self.started = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._counts = {}
+        self._errors = {}
+        self._latencies = {}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests sent on the given connection, one after the other, until the client closes it or asks
+        for it to be closed.
+        """
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                start = time.perf_counter()
+                route = 'invalid'
+                # a request that cannot be read fully leaves the connection in an unknown state, so it is closed
+                keep_alive = False
+                try:
+                    method, target, version, headers = _parse_head(head)
+                    body = await _read_body(reader, headers)
+                    keep_alive = _keeps_alive(version, headers)
+                    route = urlsplit(target).path
+                    status, response = 200, await self.dispatch(method, target, body)
+                except HTTPError as error:
+                    status, response = error.status, {'error': error.message}
+                except Exception as error:  # answer the client instead of dropping the connection
+                    status, response = 500, {'error': str(error)}
+
+                self._record(route, time.perf_counter() - start, status)
+                try:
+                    _write_response(writer, status, response, keep_alive)
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Any:
+        """Return the JSON response of the request with the given method, target and body.
+
+        Raise an HTTPError if the request cannot be answered.
+        """
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        routes = {
+            '/popular': ('GET', self.system.popular_movies),
+            '/genres': ('GET', self.system.genres),
+            '/rating': ('GET', lambda: self._rating(query)),
+            '/recommend': ('POST', lambda: self._recommend(_json_body(body))),
+            '/reviews': ('POST', lambda: self._add_review(_json_body(body))),
+            '/stats': ('GET', self.stats)
+        }
+
+        if url.path not in routes:
+            raise HTTPError(404, f'no endpoint {url.path}')
+        elif routes[url.path][0] != method:
+            raise HTTPError(405, f'{url.path} only accepts {routes[url.path][0]} requests')
+        elif url.path == '/stats':
+            # the statistics do not use the recommendation system, so they are answered even while it is busy
+            return routes[url.path][1]()
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, routes[url.path][1])
+
+    def stats(self) -> dict[str, Any]:
+        """Return the number of requests and errors, the latency percentiles in milliseconds and the throughput in
+        requests per second of each endpoint, and the counters of the result cache, with the measurements of each
+        stage of the system if the instrumentation is on.
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        endpoints = {}
+
+        for route in sorted(self._counts):
+            latencies = sorted(self._latencies[route])
+            endpoints[route] = {
+                'requests': self._counts[route],
+                'errors': self._errors.get(route, 0),
+                'per_second': self._counts[route] / elapsed,
+                'latency_ms': {name: instrumentation.percentile(latencies, percent) * 1000
+                               for name, percent in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))}
+            }
+
+        result = {'uptime_seconds': elapsed, 'requests': sum(self._counts.values()),
+                  'per_second': sum(self._counts.values()) / elapsed, 'endpoints': endpoints,
+                  'cache': self.system.cache_stats()}
+
+        if instrumentation.is_enabled():
+            result['stages'] = instrumentation.snapshot()
+
+        return result
+
+    def close(self) -> None:
+        """Wait for the requests that are running and stop the background thread."""
+        self._executor.shutdown(wait=True)
+
+    def _rating(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """Return the average rating of the movie whose title is the title parameter of the given query."""
+        if 'title' not in query:
+            raise HTTPError(400, 'missing the title parameter')
+
+        title = query['title'][0]
+        return {'title': title, 'rating': self.system.return_avg_rating(title)}
+
+    def _check_recommend(self, request: dict[str, Any]) -> None:
+        """Raise an HTTPError if the given request does not have three liked movies that are in the system and a known
+        genre.
+
+        This reads the recommendation system, so it must only run on its background thread, like the other requests.
+        """
+        liked_movies = request.get('liked')
+        genre = request.get('genre')
+
+        if not isinstance(liked_movies, list) or len(liked_movies) != 3 or \
+                not all(isinstance(title, str) for title in liked_movies):
+            raise HTTPError(400, 'liked must be a list of three movie titles')
+
+        unknown = [title for title in liked_movies if not self.system.has_movie(title)]
+        if unknown != []:
+            raise HTTPError(400, f'unknown movie {", ".join(unknown)}')
+        elif genre not in self.system.genres():
+            raise HTTPError(400, f'unknown genre {genre}')
+
+    def _recommend(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Return the top three recommended movies for the liked movies and genre of the given request.
+
+        Raise an HTTPError if the request is invalid (see _check_recommend).
+        """
+        self._check_recommend(request)
+        results = self.system.recommend(request['liked'], request['genre'], self.movie_file, self.rating_file)
+
+        return {'movies': [{'title': title, 'genres': genres, 'rating': rating} for title, genres, rating in results]}
+
+    def _add_review(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Add the review of the given request and return the title of the reviewed movie.
+
+        A title that only differs from the title of a movie in the system in case, spacing or punctuation is reviewed
+        as that movie. Any other title is reviewed as a new movie, and the titles of the movies in the system that are
+        spelled most similarly are returned as suggestions, in case it was a typo.
+        """
+        title = request.get('title')
+        rating = request.get('rating')
+
+        # bool is a subclass of int, but a JSON true or false is not a rating
+        if not isinstance(title, str) or isinstance(rating, bool) or not isinstance(rating, (int, float)) \
+                or not 0.0 <= rating <= 10.0:
+            raise HTTPError(400, 'a review needs a title and a rating between 0.0 and 10.0')
+
+        matched = self.system.match_title(title)
+        suggestions = self.system.suggest_titles(title) if matched is None else []
+        title = matched or title
+        self.system.add_reviews(title, float(rating), self.movie_file, self.rating_file)
+
+        return {'title': title, 'suggestions': suggestions}
+
+    def _record(self, route: str, latency: float, status: int) -> None:
+        """Record the latency in seconds and the status of a request to the given endpoint."""
+        if route not in self._counts:
+            self._counts[route] = 0
+            self._latencies[route] = deque(maxlen=LATENCY_WINDOW)
+
+        self._counts[route] += 1
+        self._latencies[route].append(latency)
+        if status >= 400:
+            self._errors[route] = self._errors.get(route, 0) + 1
+
+
+async def serve(service: RecommendationService, host: str = '127.0.0.1', port: int = 8080) -> None:
+    """Serve the given service on the given host and port until the process is interrupted."""
+    server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEAD_SIZE)
+
+    print(f'Serving on http://{host}:{port}')
+    async with server:
+        await server.serve_forever()
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    """Populate a recommendation system with the files in the given command line arguments and serve it."""
+    parser = argparse.ArgumentParser(description='Serve movie recommendations as JSON over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--movie-file', default='data/movies_metadata.csv')
+    parser.add_argument('--rating-file', default='data/ratings_small.csv')
+    parser.add_argument('--snapshot', default='data/graph.snapshot')
+    parser.add_argument('--review-log', default='data/reviews.log')
+    parser.add_argument('--instrument', action='store_true', help='measure each stage and report it in /stats')
+    parser.add_argument('--trace-memory', action='store_true', help='also measure the peak memory of each stage')
+    options = parser.parse_args(arguments)
+
+    if options.instrument or options.trace_memory:
+        instrumentation.enable(options.trace_memory)
+
+    system = rs.RecommendationSystem()
+    system.add_movies_users(options.movie_file, options.rating_file, options.snapshot)
+    system.open_review_log(options.review_log)
+    service = RecommendationService(system, options.movie_file, options.rating_file)
+
+    try:
+        asyncio.run(serve(service, options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        system.close_review_log()
+
+
+def _parse_head(head: bytes) -> tuple[str, str, str, dict[str, str]]:
+    """Return the method, target, HTTP version and headers (with lower case names) of the given request head.
+
+    >>> _parse_head(b'GET /popular HTTP/1.1\\r\\nHost: localhost\\r\\n\\r\\n')
+    ('GET', '/popular', 'HTTP/1.1', {'host': 'localhost'})
+    """
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise HTTPError(400, 'malformed request line')
+
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    return (parts[0], parts[1], parts[2], headers)
+
+
+def _keeps_alive(version: str, headers: dict[str, str]) -> bool:
+    """Return whether the connection is kept open after answering a request with the given version and headers.
+
+    >>> _keeps_alive('HTTP/1.1', {})
+    True
+    >>> _keeps_alive('HTTP/1.0', {'connection': 'keep-alive'})
+    True
+    >>> _keeps_alive('HTTP/1.1', {'connection': 'close'})
+    False
+    """
+    connection = headers.get('connection', '').lower()
+    return connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict[str, str]) -> bytes:
+    """Return the body of a request with the given headers, which is the next Content-Length bytes of the reader."""
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise HTTPError(400, 'malformed Content-Length') from None
+
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, f'the body must be at most {MAX_BODY_SIZE} bytes')
+
+    return await reader.readexactly(length) if length > 0 else b''
+
+
+def _json_body(body: bytes) -> dict[str, Any]:
+    """Return the JSON object in the given request body."""
+    try:
+        request = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, 'the body must be a JSON object') from None
+
+    if not isinstance(request, dict):
+        raise HTTPError(400, 'the body must be a JSON object')
+
+    return request
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, response: Any, keep_alive: bool) -> None:
+    """Write a response with the given status and JSON body to the given writer."""
+    body = json.dumps(response).encode('utf-8')
+    head = (f'HTTP/1.1 {status} {REASONS.get(status, "Error")}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+
+    writer.write(head.encode('latin-1') + body)
+
+
+if __name__ == '__main__':
+    main()
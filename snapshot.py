@@ -0,0 +1,256 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the functions that save the parsed movie and rating
+datasets into a binary snapshot file and load them back, so that starting the
+recommendation system does not need to parse the CSV files again.
+
+A snapshot file consists of an 8-byte magic string, the length of a JSON
+header, the JSON header itself and a sequence of raw arrays. The header records
+the size, modification time and hash of the source files, and the dtype,
+shape and offset of every array, so each array is read with a single call.
+
+Loading a snapshot saves the time spent parsing the CSV files and joining the
+movies with their ratings, but not memory: the arrays are turned back into the
+Python lists of the dataset, so the dataset takes as much memory as when it is
+parsed from the files.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Optional
+import numpy as np
+import dataset
+
+MAGIC = b'FFYSNAP1'
+VERSION = 1
+ALIGNMENT = 64
+
+
+def source_key(path: str, with_hash: bool = True) -> dict[str, Any]:
+    """Return a dictionary that identifies the current contents of the file at the given path by its size,
+    modification time and (optionally) the SHA-1 hash of its contents.
+    """
+    stat = os.stat(path)
+    key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    if with_hash:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        key['sha1'] = digest.hexdigest()
+
+    return key
+
+
+def is_fresh(saved_key: dict[str, Any], path: str) -> bool:
+    """Return whether the file at the given path still has the contents identified by saved_key.
+
+    The hash of the file is only computed when its size matches but its modification time does not.
+    """
+    if not os.path.exists(path):
+        return False
+
+    key = source_key(path, with_hash=False)
+    if key['size'] != saved_key['size']:
+        return False
+    elif key['mtime_ns'] == saved_key['mtime_ns']:
+        return True
+    else:
+        return source_key(path)['sha1'] == saved_key['sha1']
+
+
+def save(snapshot_file: str, data: dataset.Dataset, movies: Optional[list] = None, review_seq: int = 0) -> None:
+    """Save the contents of the given dataset into a snapshot file at the given path.
+
+    If movies is given, it is saved instead of the movies of the dataset, in the same format as
+    file_reading.combined_files. This is used to fold the reviews up to the sequence number review_seq of the review
+    log into the snapshot (see review_log.py).
+
+    The snapshot is written to a temporary file first and then renamed, so a reader never sees a partial snapshot.
+    """
+    movies = data.movies() if movies is None else movies
+    genre_names = sorted(data.genres() | {genre for movie in movies for genre in movie[2]})
+    genre_ids = {genre: i for i, genre in enumerate(genre_names)}
+    titles = [movie[1].encode('utf-8') for movie in movies]
+
+    arrays = {
+        'movie_id': np.array([movie[0] for movie in movies], dtype=np.int64),
+        'avg_rating': np.array([movie[3] for movie in movies], dtype=np.float64),
+        'vote_count': np.array([movie[4] for movie in movies], dtype=np.int64),
+        'title_offsets': _offsets([len(title) for title in titles]),
+        'title_bytes': np.frombuffer(b''.join(titles), dtype=np.uint8),
+        'genre_offsets': _offsets([len(movie[2]) for movie in movies]),
+        'genre_ids': np.array([genre_ids[genre] for movie in movies for genre in movie[2]], dtype=np.int16),
+        'user_offsets': _offsets([len(movie[5]) for movie in movies]),
+        'user_ids': np.array([user_id for movie in movies for user_id in movie[5]], dtype=np.int64)
+    }
+
+    header = {
+        'version': VERSION,
+        'sources': {'movie_file': source_key(data.movie_file), 'rating_file': source_key(data.rating_file)},
+        'genres': genre_names,
+        'last_movie_id': data.last_movie_id(),
+        'last_user_id': data.last_user_id(),
+        'review_seq': review_seq,
+        'arrays': {}
+    }
+
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    temp_file = snapshot_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<Q', len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(data_start + header['arrays'][name]['offset'])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+
+    os.replace(temp_file, snapshot_file)
+
+
+def read_header(snapshot_file: str) -> Optional[tuple[dict[str, Any], int]]:
+    """Return the header of the snapshot file at the given path and the position where its arrays start.
+
+    Return None if there is no such file or it is not a snapshot of the current version.
+    """
+    if not os.path.exists(snapshot_file):
+        return None
+
+    with open(snapshot_file, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        header_length = struct.unpack('<Q', file.read(8))[0]
+        header = json.loads(file.read(header_length).decode('utf-8'))
+
+    if header.get('version') != VERSION:
+        return None
+
+    return (header, _aligned(len(MAGIC) + 8 + header_length))
+
+
+def read_arrays(snapshot_file: str) -> Optional[tuple[dict[str, Any], dict[str, np.ndarray]]]:
+    """Return the header of the snapshot file at the given path and its arrays.
+
+    Return None if there is no such file or it is not a snapshot of the current version.
+    """
+    header_info = read_header(snapshot_file)
+    if header_info is None:
+        return None
+
+    header, data_start = header_info
+    arrays = {}
+
+    with open(snapshot_file, 'rb') as file:
+        for name, info in header['arrays'].items():
+            file.seek(data_start + info['offset'])
+            arrays[name] = np.fromfile(file, dtype=np.dtype(info['dtype']),
+                                       count=int(np.prod(info['shape']))).reshape(info['shape'])
+
+    return (header, arrays)
+
+
+def load(snapshot_file: str, data: dataset.Dataset) -> bool:
+    """Fill the given dataset with the contents of the snapshot file at the given path and return True.
+
+    The arrays are converted into the movie lists of the dataset, in the same format as file_reading.combined_files,
+    so the dataset holds its own copy of every movie and user id.
+
+    Return False and leave the dataset unchanged if the snapshot is missing, of another version, or was saved from
+    source files that have changed since.
+    """
+    snapshot = read_arrays(snapshot_file)
+    if snapshot is None:
+        return False
+
+    header, arrays = snapshot
+    if not (is_fresh(header['sources']['movie_file'], data.movie_file)
+            and is_fresh(header['sources']['rating_file'], data.rating_file)):
+        return False
+
+    genre_names = header['genres']
+    title_bytes = arrays['title_bytes'].tobytes()
+    title_offsets = arrays['title_offsets'].tolist()
+    genre_offsets = arrays['genre_offsets'].tolist()
+    genre_ids = arrays['genre_ids'].tolist()
+    user_offsets = arrays['user_offsets'].tolist()
+    user_ids = arrays['user_ids'].tolist()
+
+    movies = []
+    for i, (movie_id, avg_rating, vote_count) in enumerate(zip(arrays['movie_id'].tolist(),
+                                                               arrays['avg_rating'].tolist(),
+                                                               arrays['vote_count'].tolist())):
+        title = title_bytes[title_offsets[i]:title_offsets[i + 1]].decode('utf-8')
+        genres = [genre_names[genre] for genre in genre_ids[genre_offsets[i]:genre_offsets[i + 1]]]
+        movies.append([movie_id, title, genres, avg_rating, vote_count, user_ids[user_offsets[i]:user_offsets[i + 1]]])
+
+    data.restore(movies, set(genre_names), header['last_movie_id'], header['last_user_id'],
+                 header.get('review_seq', 0))
+
+    return True
+
+
+def load_or_build(snapshot_file: str, data: dataset.Dataset) -> bool:
+    """Fill the given dataset from the snapshot file at the given path if it is up to date. Otherwise, read the
+    source files of the dataset and save a new snapshot for the next start.
+
+    Return whether the snapshot was used.
+    """
+    if load(snapshot_file, data):
+        return True
+
+    save(snapshot_file, data)
+
+    return False
+
+
+def _offsets(lengths: list[int]) -> np.ndarray:
+    """Return an array of offsets where the i-th item starts at offsets[i] and ends at offsets[i + 1] in an array that
+    concatenates items with the given lengths.
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    return offsets
+
+
+def _aligned(position: int) -> int:
+    """Return the smallest multiple of ALIGNMENT that is greater than or equal to the given position."""
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['hashlib', 'json', 'os', 'struct', 'numpy', 'dataset'],
+        'allowed-io': ['source_key', 'save', 'read_header', 'read_arrays'],
+        'max-line-length': 120
+    })
@@ -8,6 +8,12 @@ of our movie recommendations. Whether the recommendations are accurate is
 determined by the percentage of overlapping movies between the training and
 testing sets.
 
+The evaluate function is an offline evaluation engine for the whole rating
+file: it loads the files once, holds out part of each user's reviews with a
+deterministic split, answers the queries of the users in a pool of worker
+processes that share the same read-only recommendation system, and reports
+precision@k, recall@k, hit rate, coverage and latency percentiles.
+
 Copyright and Usage Information
 ===============================
 
@@ -18,32 +24,54 @@ expressly prohibited.
 
 This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
 """
-import computation, file_reading as fr, recommendation_system as rs
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import time
+from typing import Any, Optional
+import dataset, instrumentation, recommendation_system as rs
+
+# The state shared by the evaluation workers: the recommendation system built from the training part of the split,
+# the liked movie titles of each evaluated user, and the arguments they were built from
+_EVALUATION: dict[str, Any] = {}
 
 
 def testing_recommendation_accuracy(movie_file: str, rating_file: str, testing_file: str) -> list[float]:
     """Return the percetage of movie list from the testing user history that matches with the recommended movie list.
     """
-    popular_users = check_popular_user(movie_file, rating_file, testing_file)
+    system = rs.RecommendationSystem()
+    system.add_movies_users(movie_file, rating_file)
+    popular_users = check_popular_user(movie_file, rating_file, testing_file, system)
+    rec_movies = system.recommend_batch([user_tuple[1][0:3] for user_tuple in popular_users], movie_file, rating_file)
+
     percentage = []
-    for user_tuple in popular_users:
-        recommended_movies = get_recommended_movies(user_tuple[1][0:3], movie_file, rating_file)
+    for user_tuple, movies in zip(popular_users, rec_movies):
+        recommended_movies = [movie.title for movie in movies]
         connected_movies = return_connected_movies(user_tuple[0], movie_file, testing_file)
         percentage.append(percent_matched(connected_movies, recommended_movies))
 
     return percentage
 
 
-def check_popular_user(movie_file: str, rating_file: str, testing_file: str) -> list[tuple[int, list]]:
+def check_popular_user(movie_file: str, rating_file: str, testing_file: str,
+                       system: Optional[rs.RecommendationSystem] = None) -> list[tuple[int, list]]:
     """Return a list of tuples where the first item is the user id and the second item is a list of the user's connectd
-    movies that are in our list of 50 popular movies.
+    movies that are in our list of 50 popular movies, in the order of the movie file.
+
+    If a recommendation system populated with the given files is given, its popular movies are used instead of
+    computing them from the files again.
     """
-    popular_movies = computation.popular_movies(movie_file, rating_file)
-    title_id = fr.movie_title_id(movie_file, rating_file)
-    # a set of the 50 most popular movies' titles
-    movie_ids = {title_id[movie_title] for movie_title in popular_movies}
+    if system is not None:
+        popular_movies = system.popular_movies()
+    else:
+        popular_movies = dataset.load(movie_file, rating_file).popular_movies()
+    titles = dataset.load(movie_file, rating_file).titles()
+    title_id = dataset.load(movie_file, rating_file).title_id()
+    # a set of the 50 most popular movies' ids
+    movie_ids = {titles.id_of(movie_title) for movie_title in popular_movies}
     # a dictionary of users and their connected movies who are in the testing file
-    users = fr.user_movies(movie_file, testing_file)
+    users = dataset.load(movie_file, testing_file).user_movies()
 
     popular_users = []
 
@@ -57,6 +85,7 @@ def check_popular_user(movie_file: str, rating_file: str, testing_file: str) ->
 
         if user_point > 3:
             # converting movie ids into movie titles
+            # in the order of the movie file, like before the title index, so the same three movies are queried
             lst = [title for title in title_id if title_id[title] in popular_linked_movies]
             popular_users.append((user_id, lst))
 
@@ -66,27 +95,151 @@ def check_popular_user(movie_file: str, rating_file: str, testing_file: str) ->
 def return_connected_movies(user_id: int, movie_file: str, testing_file: str) -> list[str]:
     """Return a list of the user's connected movies (titles).
     """
-    users = fr.user_movies(movie_file, testing_file)
-    title_id = fr.movie_title_id(movie_file, testing_file)
-    movie_ids = users[user_id]
+    users = dataset.load(movie_file, testing_file).user_movies()
+    titles = dataset.load(movie_file, testing_file).titles()
 
-    return [title for title in title_id if title_id[title] in movie_ids]
+    return [titles.title_of(movie) for movie in users[user_id] if titles.title_of(movie) is not None]
 
 
-def get_recommended_movies(movie_list: list, movie_file: str, rating_file: str) -> list:
-    """Return a list of recommended movies based on the liked movie list given using the RecommendationSystem.
+def percent_matched(lst1: list, lst2: list) -> float:
+    """Return the percetage that the two lists match with each other, excluding three items from the first list.
     """
-    system = rs.RecommendationSystem()
-    system.add_movies_users(movie_file, rating_file)
-    rec_movies = system.return_movies(movie_list, movie_file, rating_file)
+    return round(len([movie for movie in lst1 if movie in lst2]) / (len(lst1) - 3), 3)
 
-    return [movie.title for movie in rec_movies]
 
+def split_dataset(movie_file: str, rating_file: str, test_fraction: float = 0.2, min_movies: int = 5,
+                  seed: int = 0) -> tuple[dataset.Dataset, dict[int, list[str]], dict[int, set[int]]]:
+    """Split the reviews in the given files into a training dataset and held-out test movies, and return a tuple of:
+        - the training dataset, which has every review except the held-out ones
+        - a dictionary that maps each evaluated user id to the titles of three of their training movies, the ones with
+          the most votes, which are the liked movies of their query
+        - a dictionary that maps each evaluated user id to the set of their held-out movie ids
 
-def percent_matched(lst1: list, lst2: list) -> float:
-    """Return the percetage that the two lists match with each other, excluding three items from the first list.
+    Only the users with at least min_movies reviewed movies are evaluated. For each of them, test_fraction of their
+    movies (and at least one) are held out, chosen by a random generator seeded from seed and the user id, so the
+    split is the same on every run and in every process.
+
+    Preconditions:
+        - 0.0 < test_fraction < 1.0
+        - min_movies >= 4
     """
-    return round(len([movie for movie in lst1 if movie in lst2]) / (len(lst1) - 3), 3)
+    data = dataset.load(movie_file, rating_file)
+    votes = {movie[0]: movie[4] for movie in data.movies()}
+    user_movies = data.user_movies()
+    queries = {}
+    held_out = {}
+
+    for user_id in user_movies:
+        if len(user_movies[user_id]) >= min_movies:
+            movie_ids = sorted(user_movies[user_id])
+            num_test = max(1, min(len(movie_ids) - 3, round(test_fraction * len(movie_ids))))
+            test = set(random.Random(seed * 1000003 + user_id).sample(movie_ids, num_test))
+            train = sorted((movie_id for movie_id in movie_ids if movie_id not in test),
+                           key=lambda movie_id: (-votes[movie_id], movie_id))
+
+            queries[user_id] = [data.titles().title_of(movie_id) for movie_id in train[:3]]
+            held_out[user_id] = test
+
+    movies = []
+    for movie in data.movies():
+        linked_users = [user_id for user_id in movie[5] if movie[0] not in held_out.get(user_id, ())]
+        if linked_users != []:
+            movies.append(movie[:5] + [linked_users])
+
+    training = dataset.Dataset(movie_file, rating_file)
+    training.restore(movies, data.genres(), data.last_movie_id(), data.last_user_id())
+
+    return (training, queries, held_out)
+
+
+def evaluate(movie_file: str, rating_file: str, k: int = 10, test_fraction: float = 0.2, min_movies: int = 5,
+             max_users: Optional[int] = None, seed: int = 0, backend: str = 'vertices', engine: str = 'points',
+             workers: Optional[int] = None) -> dict[str, Any]:
+    """Evaluate the recommendations of a RecommendationSystem with the given backend and engine on a split of the
+    given files (see split_dataset), and return a dictionary of the results.
+
+    Each evaluated user queries the system with three of their training movies. The recommended movies are ranked by
+    average rating, the order they are shown in, and the top k are compared with the user's held-out movies:
+        - precision_at_k: the average fraction of the top k that are held-out movies
+        - recall_at_k: the average fraction of the held-out movies that are in the top k
+        - hit_rate: the fraction of users with at least one held-out movie in the top k
+        - coverage: the fraction of the training movies that are in the top k of at least one user
+        - latency_ms: the 50th, 90th and 99th percentiles and the maximum of the time taken by each query
+
+    If max_users is given, only that many users, chosen with the given seed, are evaluated. The queries are answered by
+    the given number of worker processes (all processors by default), or in this process if workers is 1. Where
+    processes can be forked, the workers share the system built here instead of building their own.
+    """
+    arguments = (movie_file, rating_file, test_fraction, min_movies, seed, backend, engine)
+    _prepare_evaluation(*arguments)
+    held_out = _EVALUATION['held_out']
+
+    users = sorted(held_out)
+    if max_users is not None and max_users < len(users):
+        users = sorted(random.Random(seed).sample(users, max_users))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [_evaluate_user(user_id, k) for user_id in users]
+    else:
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=_prepare_evaluation,
+                                                    initargs=arguments) as executor:
+            results = list(executor.map(_evaluate_user, users, [k] * len(users),
+                                        chunksize=max(1, len(users) // (4 * workers))))
+
+    hits = [len(held_out[user_id].intersection(top)) for user_id, (top, _) in zip(users, results)]
+    latencies = sorted(latency * 1000 for _, latency in results)
+    recommended = {movie_id for top, _ in results for movie_id in top}
+    num_users = max(1, len(users))
+
+    return {
+        'users': len(users),
+        'k': k,
+        'precision_at_k': sum(hits) / (k * num_users),
+        'recall_at_k': sum(hit / len(held_out[user_id]) for user_id, hit in zip(users, hits)) / num_users,
+        'hit_rate': sum(1 for hit in hits if hit > 0) / num_users,
+        'coverage': len(recommended) / max(1, len(_EVALUATION['system'].dataset(movie_file, rating_file).movies())),
+        'latency_ms': {'p50': instrumentation.percentile(latencies, 50),
+                       'p90': instrumentation.percentile(latencies, 90),
+                       'p99': instrumentation.percentile(latencies, 99),
+                       'max': latencies[-1] if latencies != [] else 0.0}
+    }
+
+
+def _prepare_evaluation(movie_file: str, rating_file: str, test_fraction: float, min_movies: int, seed: int,
+                        backend: str, engine: str) -> None:
+    """Split the given files and build the recommendation system of the evaluation from the training part, unless it
+    was already built from the same arguments, for example in the process this worker was forked from.
+    """
+    arguments = (movie_file, rating_file, test_fraction, min_movies, seed, backend, engine)
+    if _EVALUATION.get('arguments') == arguments:
+        return
+
+    training, queries, held_out = split_dataset(movie_file, rating_file, test_fraction, min_movies, seed)
+    # without a cache, the latency of each query includes computing its recommendations
+    system = rs.RecommendationSystem(backend, engine, cache_size=0)
+    system.add_dataset(training)
+    if engine == 'als':
+        system.train_als(movie_file, rating_file)
+    elif engine == 'cooccurrence':
+        system.build_cooccurrence(movie_file, rating_file)
+
+    _EVALUATION.update({'arguments': arguments, 'system': system, 'queries': queries, 'held_out': held_out})
+
+
+def _evaluate_user(user_id: int, k: int) -> tuple[list[int], float]:
+    """Return the ids of the top k movies recommended for the query of the user with the given id, ranked by average
+    rating, and the time taken by the query in seconds.
+    """
+    system = _EVALUATION['system']
+    movie_file, rating_file = _EVALUATION['arguments'][:2]
+
+    start = time.perf_counter()
+    movies = system.return_movies(_EVALUATION['queries'][user_id], movie_file, rating_file)
+    top = sorted(movies, key=lambda movie: (-movie.avg_rating, movie.movie_id))[:k]
+
+    return ([movie.movie_id for movie in top], time.perf_counter() - start)
 
 
 if __name__ == '__main__':
@@ -96,6 +249,7 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['computation', 'file_reading', 'recommendation_system'],
+        'extra-imports': ['concurrent.futures', 'multiprocessing', 'os', 'random', 'time', 'dataset',
+                          'instrumentation', 'recommendation_system'],
         'max-line-length': 120
     })
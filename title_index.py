@@ -0,0 +1,180 @@
+"""CSC111 Course Project: Films for You
+
+Content and Information
+===============================
+
+This module contains the TitleIndex class, which maps movie titles to their
+ids and back in constant time, and finds titles by prefix or by approximate
+spelling for the review tab of the interface.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of the professors
+and TAs for CSC111 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Juliana Zhang and Shih-Hsin Chuang.
+"""
+from __future__ import annotations
+import bisect
+import heapq
+from typing import Optional
+
+
+class TitleIndex:
+    """A bidirectional index between movie titles and movie ids, with prefix and typo-tolerant search.
+
+    If several movies have the same title, the title maps to the last one added, like file_reading.movie_title_id.
+
+    The prefix search uses a list of normalized titles kept in sorted order, and the typo-tolerant search uses an
+    inverted index from each trigram (three consecutive characters) of a normalized title to the titles containing it.
+
+    Representation Invariants:
+        - all(self._title_id[self._id_title[movie_id]] == movie_id for movie_id in self._id_title)
+    """
+    _title_id: dict[str, int]
+    _id_title: dict[int, str]
+    _normalized: dict[str, set[str]]
+    _prefixes: list[tuple[str, str]]
+    _sorted: bool
+    _trigrams: dict[str, set[str]]
+    _num_trigrams: dict[str, int]
+
+    def __init__(self, title_id: Optional[dict[str, int]] = None) -> None:
+        """Initialize an index of the titles in the given dictionary, which maps each movie title to its id."""
+        self._title_id = {}
+        self._id_title = {}
+        self._normalized = {}
+        self._prefixes = []
+        self._sorted = False
+        self._trigrams = {}
+        self._num_trigrams = {}
+
+        for title in title_id or {}:
+            self.add(title, title_id[title])
+
+    def add(self, title: str, movie_id: int) -> None:
+        """Add the given title with the given movie id to this index.
+
+        If the title is already in the index, it now maps to the given movie id instead.
+        """
+        if title in self._title_id:
+            self._id_title.pop(self._title_id[title], None)
+        else:
+            key = normalize(title)
+            self._normalized.setdefault(key, set()).add(title)
+
+            if self._sorted:
+                bisect.insort(self._prefixes, (key, title))
+            else:
+                self._prefixes.append((key, title))
+
+            trigrams = _trigrams(key)
+            self._num_trigrams[title] = len(trigrams)
+            for trigram in trigrams:
+                self._trigrams.setdefault(trigram, set()).add(title)
+
+        self._title_id[title] = movie_id
+        self._id_title[movie_id] = title
+
+    def id_of(self, title: str) -> Optional[int]:
+        """Return the id of the movie with the given title, or None if there is no such movie."""
+        return self._title_id.get(title)
+
+    def title_of(self, movie_id: int) -> Optional[str]:
+        """Return the title of the movie with the given id, or None if there is no such movie."""
+        return self._id_title.get(movie_id)
+
+    def __contains__(self, title: str) -> bool:
+        """Return whether the given title is in this index."""
+        return title in self._title_id
+
+    def __len__(self) -> int:
+        """Return the number of titles in this index."""
+        return len(self._title_id)
+
+    def prefix(self, text: str, limit: int = 10) -> list[str]:
+        """Return up to limit titles that start with the given text, ignoring case and punctuation, in alphabetical
+        order.
+        """
+        if not self._sorted:
+            self._prefixes.sort()
+            self._sorted = True
+
+        key = normalize(text)
+        result = []
+        i = bisect.bisect_left(self._prefixes, (key, ''))
+
+        while i < len(self._prefixes) and len(result) < limit and self._prefixes[i][0].startswith(key):
+            result.append(self._prefixes[i][1])
+            i += 1
+
+        return result
+
+    def fuzzy(self, text: str, limit: int = 5) -> list[str]:
+        """Return up to limit titles that are spelled most similarly to the given text, from the most similar to the
+        least similar.
+
+        The similarity of two titles is the Dice coefficient of their sets of trigrams, so only the titles that share
+        at least one trigram with the given text are visited.
+        """
+        query = _trigrams(normalize(text))
+        shared = {}
+
+        for trigram in query:
+            for title in self._trigrams.get(trigram, set()):
+                shared[title] = shared.get(title, 0) + 1
+
+        scores = {title: 2 * shared[title] / (len(query) + self._num_trigrams[title]) for title in shared}
+
+        return heapq.nlargest(limit, sorted(scores), key=lambda title: scores[title])
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the title in this index that the given text refers to: the exact title, or else a title that only
+        differs in case, spacing or punctuation. Return None if there is no such title.
+
+        A title that is only spelled similarly is not returned, since it may be a different movie, such as a sequel;
+        use fuzzy to suggest such titles instead.
+        """
+        if text in self._title_id:
+            return text
+
+        key = normalize(text)
+        if key in self._normalized:
+            return min(self._normalized[key])
+
+        return None
+
+
+def normalize(title: str) -> str:
+    """Return the given title in lower case, with every run of punctuation and spaces replaced by a single space.
+
+    >>> normalize('  The Lord of the Rings: The Two Towers ')
+    'the lord of the rings the two towers'
+    """
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in title.lower()).split())
+
+
+def _trigrams(key: str) -> set[str]:
+    """Return the set of trigrams of the given normalized title, padded with spaces so short titles have trigrams.
+
+    >>> sorted(_trigrams('up'))
+    ['  u', ' up', 'up ']
+    """
+    padded = '  ' + key + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['bisect', 'heapq'],
+        'max-line-length': 120
+    })